@@ -2,14 +2,24 @@
 # copyright notices and license terms.
 from trytond.pool import Pool
 from . import invoice
+from . import reporting
 from . import sale
+from . import template
+from . import uom
 
 
 def register():
     Pool.register(
+        invoice.Invoice,
         invoice.InvoiceLine,
+        invoice.InvoiceInformationUomTotal,
+        reporting.InvoiceLineInformationUom,
+        template.Template,
+        template.ListPrice,
+        uom.Uom,
         module='account_invoice_information_uom', type_='model')
     Pool.register(
+        sale.Sale,
         sale.SaleLine,
         depends=['sale'],
         module='account_invoice_information_uom', type_='model')
@@ -0,0 +1,210 @@
+# The COPYRIGHT file at the top level of this repository contains the full
+# copyright notices and license terms.
+"""
+Audit of the information quantities and prices of the posted invoice lines
+
+The stored values are compared with the values recomputed from the product
+templates. The lines are split by fiscal period of the invoice move and the
+periods are audited in parallel. Run it with:
+
+    python -m trytond.modules.account_invoice_information_uom.audit \\
+        -c trytond.conf -d database report.csv
+
+With --fix, the stored values are replaced by the recomputed ones.
+"""
+import argparse
+import csv
+import math
+import multiprocessing
+import os
+import sys
+from collections import defaultdict
+
+from sql import Literal
+
+from trytond import backend
+from trytond.config import config
+from trytond.pool import Pool
+from trytond.tools import grouped_slice, reduce_ids
+from trytond.transaction import Transaction
+
+from .invoice import _clear_cache
+
+__all__ = ['audit_period', 'periods', 'run', 'main']
+
+HEADER = [
+    'period', 'invoice', 'line',
+    'info_quantity', 'computed_info_quantity',
+    'info_unit_price', 'computed_info_unit_price',
+    ]
+
+_database = None
+
+
+def _init(config_file, database):
+    global _database
+    config.update_etc(config_file)
+    Pool.start()
+    pool = Pool(database)
+    with Transaction().start(database, 0, readonly=True):
+        pool.init()
+    _database = database
+
+
+def _line_ids(period_id, size):
+    "Yield the chunks of ids of the lines of the period"
+    pool = Pool()
+    Invoice = pool.get('account.invoice')
+    InvoiceLine = pool.get('account.invoice.line')
+    Move = pool.get('account.move')
+    Product = pool.get('product.product')
+    Template = pool.get('product.template')
+    invoice = Invoice.__table__()
+    line = InvoiceLine.__table__()
+    move = Move.__table__()
+    product = Product.__table__()
+    template = Template.__table__()
+    connection = Transaction().connection
+
+    if backend.name == 'postgresql':
+        # Server-side cursor to not load all the ids of the period
+        cursor = connection.cursor('info_uom_audit_%s' % period_id)
+        cursor.itersize = size
+    else:
+        cursor = connection.cursor()
+    # The lines of products without information unit are not audited as
+    # they may have been stored with zero instead of NULL
+    cursor.execute(*line.join(invoice, condition=line.invoice == invoice.id
+            ).join(move, condition=invoice.move == move.id
+            ).join(product, condition=line.product == product.id
+            ).join(template, condition=product.template == template.id
+            ).select(line.id,
+            where=(move.period == period_id)
+            & invoice.state.in_(['posted', 'paid'])
+            & (line.type == 'line')
+            & (template.use_info_unit == Literal(True)),
+            order_by=[line.id]))
+    try:
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield [r[0] for r in rows]
+    finally:
+        cursor.close()
+
+
+def _differ(value, computed):
+    if value is None or computed is None:
+        return value != computed
+    return not math.isclose(value, computed, rel_tol=0, abs_tol=1e-9)
+
+
+def _fix(discrepancies):
+    pool = Pool()
+    InvoiceLine = pool.get('account.invoice.line')
+    Total = pool.get('account.invoice.information_uom.total')
+    table = InvoiceLine.__table__()
+    cursor = Transaction().connection.cursor()
+
+    to_update = defaultdict(list)
+    for (_, _, line_id, _, info_quantity, _, info_unit_price
+            ) in discrepancies:
+        to_update[info_quantity, info_unit_price].append(line_id)
+    # Posted lines can not be written so they are updated in SQL
+    for (info_quantity, info_unit_price), line_ids in to_update.items():
+        for sub_ids in grouped_slice(line_ids):
+            cursor.execute(*table.update(
+                    [table.info_quantity, table.info_unit_price],
+                    [info_quantity, info_unit_price],
+                    where=reduce_ids(table.id, sub_ids)))
+    _clear_cache(InvoiceLine, [d[2] for d in discrepancies])
+    Total.update_totals(list({d[1] for d in discrepancies}))
+
+
+def audit_period(period_id, company_id, size=1000, fix=False):
+    """
+    Return the discrepancies of the lines of the period
+
+    It must be called in a process initialized for the database.
+    """
+    with Transaction().start(_database, 0, readonly=not fix,
+            context={'company': company_id}) as transaction:
+        pool = Pool()
+        InvoiceLine = pool.get('account.invoice.line')
+
+        discrepancies = []
+        for line_ids in _line_ids(period_id, size):
+            lines = InvoiceLine.browse(line_ids)
+            for line, (info_quantity, info_unit_price) in zip(
+                    lines, InvoiceLine.get_info_values(lines)):
+                if (_differ(line.info_quantity, info_quantity)
+                        or _differ(line.info_unit_price, info_unit_price)):
+                    discrepancies.append((
+                            period_id, line.invoice.id, line.id,
+                            line.info_quantity, info_quantity,
+                            line.info_unit_price, info_unit_price))
+            # Release the records of the chunk
+            transaction.cache.clear()
+        if fix and discrepancies:
+            _fix(discrepancies)
+        return discrepancies
+
+
+def _audit_period(args):
+    return audit_period(*args)
+
+
+def periods(database):
+    "Return the list of (period id, company id) of the database"
+    with Transaction().start(database, 0, readonly=True):
+        pool = Pool()
+        Period = pool.get('account.period')
+        period = Period.__table__()
+        cursor = Transaction().connection.cursor()
+        cursor.execute(*period.select(
+                period.id, period.company,
+                order_by=[period.start_date.desc, period.id.desc]))
+        return cursor.fetchall()
+
+
+def run(config_file, database, output, processes=None, size=1000, fix=False):
+    "Audit all the periods and write the discrepancies as CSV to output"
+    # Spawn to not share the database connections with the workers
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=_init,
+            initargs=(config_file, database)) as pool:
+        _init(config_file, database)
+        tasks = [(period_id, company_id, size, fix)
+            for period_id, company_id in periods(database)]
+        writer = csv.writer(output)
+        writer.writerow(HEADER)
+        count = 0
+        for discrepancies in pool.imap_unordered(_audit_period, tasks):
+            writer.writerows(discrepancies)
+            count += len(discrepancies)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-c', '--config', dest='config_file',
+        default=os.environ.get('TRYTOND_CONFIG'),
+        help="the trytond configuration file")
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('-j', '--processes', type=int,
+        help="the number of processes (default: the number of CPUs)")
+    parser.add_argument('-s', '--size', type=int, default=1000,
+        help="the number of lines recomputed at once")
+    parser.add_argument('--fix', action='store_true',
+        help="store the recomputed values")
+    parser.add_argument('output', nargs='?', type=argparse.FileType('w'),
+        default=sys.stdout, help="the CSV report (default: stdout)")
+    args = parser.parse_args()
+    count = run(args.config_file, args.database, args.output,
+        processes=args.processes, size=args.size, fix=args.fix)
+    print("%d discrepancies" % count, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
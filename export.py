@@ -0,0 +1,172 @@
+# The COPYRIGHT file at the top level of this repository contains the full
+# copyright notices and license terms.
+"""
+Export of the invoice lines with their information quantities and prices
+
+The lines are read by chunks straight from the database and written as CSV
+or JSON Lines, so the memory does not grow with the number of lines. Run it
+with:
+
+    python -m trytond.modules.account_invoice_information_uom.export \\
+        -c trytond.conf -d database --from 2024-01-01 --to 2024-12-31 \\
+        lines.csv
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+from decimal import Decimal
+
+from sql import Literal
+from sql.conditionals import Case, Coalesce
+
+from trytond import backend
+from trytond.config import config
+from trytond.pool import Pool
+from trytond.transaction import Transaction
+
+__all__ = ['COLUMNS', 'export_lines', 'write_csv', 'write_jsonl', 'main']
+
+COLUMNS = [
+    'line', 'invoice', 'invoice_type', 'invoice_date', 'party', 'product',
+    'quantity', 'unit', 'unit_price',
+    'info_quantity', 'info_unit', 'info_unit_price',
+    ]
+FORMATS = ['csv', 'jsonl']
+
+
+def export_lines(company=None, from_date=None, to_date=None,
+        states=('posted', 'paid'), size=1000):
+    '''
+    Yield the chunks of rows of the invoice lines in the order of COLUMNS
+
+    It must be called in a transaction.
+    '''
+    pool = Pool()
+    Invoice = pool.get('account.invoice')
+    InvoiceLine = pool.get('account.invoice.line')
+    Party = pool.get('party.party')
+    Product = pool.get('product.product')
+    Template = pool.get('product.template')
+    Uom = pool.get('product.uom')
+    line = InvoiceLine.__table__()
+    invoice = Invoice.__table__()
+    party = Party.__table__()
+    product = Product.__table__()
+    template = Template.__table__()
+    unit = Uom.__table__()
+    info_unit = Uom.__table__()
+    connection = Transaction().connection
+
+    # Lines stored before their template used an information unit
+    info_unit_id = Coalesce(line.info_unit, Case(
+            (template.use_info_unit == Literal(True), template.info_unit),
+            else_=None))
+    query = (line
+        .join(invoice, condition=line.invoice == invoice.id)
+        .join(party, condition=invoice.party == party.id)
+        .join(product, 'LEFT', condition=line.product == product.id)
+        .join(template, 'LEFT', condition=product.template == template.id)
+        .join(unit, 'LEFT', condition=line.unit == unit.id)
+        .join(info_unit, 'LEFT', condition=info_unit_id == info_unit.id)
+        .select(
+            line.id, invoice.number, invoice.type, invoice.invoice_date,
+            party.code, product.code,
+            line.quantity, unit.symbol, line.unit_price,
+            line.info_quantity, info_unit.symbol, line.info_unit_price,
+            order_by=[line.id]))
+    query.where = (line.type == 'line') & invoice.state.in_(list(states))
+    if company is not None:
+        query.where &= invoice.company == company
+    if from_date is not None:
+        query.where &= invoice.invoice_date >= from_date
+    if to_date is not None:
+        query.where &= invoice.invoice_date <= to_date
+
+    if backend.name == 'postgresql':
+        # Server-side cursor to not load all the rows
+        cursor = connection.cursor('info_uom_export')
+        cursor.itersize = size
+    else:
+        cursor = connection.cursor()
+    cursor.execute(*query)
+    try:
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def _format(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    elif isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def write_csv(output, chunks):
+    "Write the chunks of rows as CSV and return the number of rows"
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+    count = 0
+    for rows in chunks:
+        writer.writerows([_format(v) for v in row] for row in rows)
+        count += len(rows)
+    return count
+
+
+def write_jsonl(output, chunks):
+    "Write the chunks of rows as JSON Lines and return the number of rows"
+    count = 0
+    for rows in chunks:
+        output.writelines(
+            json.dumps(dict(zip(COLUMNS, map(_format, row)))) + '\n'
+            for row in rows)
+        count += len(rows)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-c', '--config', dest='config_file',
+        default=os.environ.get('TRYTOND_CONFIG'),
+        help="the trytond configuration file")
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('--company', type=int)
+    parser.add_argument('--from', dest='from_date',
+        type=datetime.date.fromisoformat)
+    parser.add_argument('--to', dest='to_date',
+        type=datetime.date.fromisoformat)
+    parser.add_argument('-f', '--format', choices=FORMATS,
+        help="the format of the output (default: from its extension "
+        "or csv)")
+    parser.add_argument('-s', '--size', type=int, default=1000,
+        help="the number of lines read at once")
+    parser.add_argument('output', nargs='?', type=argparse.FileType('w'),
+        default=sys.stdout, help="the output file (default: stdout)")
+    args = parser.parse_args()
+
+    format_ = args.format
+    if not format_:
+        format_ = 'jsonl' if args.output.name.endswith('.jsonl') else 'csv'
+    write = {'csv': write_csv, 'jsonl': write_jsonl}[format_]
+
+    config.update_etc(args.config_file)
+    Pool.start()
+    pool = Pool(args.database)
+    with Transaction().start(args.database, 0, readonly=True):
+        pool.init()
+        count = write(args.output, export_lines(
+                company=args.company, from_date=args.from_date,
+                to_date=args.to_date, size=args.size))
+    print("%d lines" % count, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
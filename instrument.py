@@ -0,0 +1,142 @@
+# The COPYRIGHT file at the top level of this repository contains the full
+# copyright notices and license terms.
+"""
+Opt-in instrumentation of the information UOM hot paths
+
+It is enabled with the instrument option of the
+account_invoice_information_uom configuration section. When disabled, the
+decorator returns the function unchanged.
+
+Queries are counted on SQLite and, on PostgreSQL, when the
+trytond.backend.postgresql.database logger is enabled for DEBUG.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+from weakref import WeakKeyDictionary
+
+from trytond.config import config
+from trytond.transaction import Transaction
+
+__all__ = ['ENABLED', 'instrumented', 'record_cache', 'stats', 'dump']
+
+ENABLED = config.getboolean('account_invoice_information_uom', 'instrument',
+    default=False)
+_SAMPLES = config.getint('account_invoice_information_uom',
+    'instrument_samples', default=10000)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_calls = defaultdict(int)
+_durations = defaultdict(lambda: deque(maxlen=_SAMPLES))
+_cumulative = defaultdict(float)
+_queries = defaultdict(int)
+_caches = defaultdict(lambda: [0, 0])
+_local = threading.local()
+_traced = WeakKeyDictionary()
+
+
+class _QueryHandler(logging.Handler):
+    "Count the queries logged by the PostgreSQL cursor"
+
+    def emit(self, record):
+        _local.queries = getattr(_local, 'queries', 0) + 1
+
+
+def _count_query(statement):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+
+def _query_count():
+    connection = Transaction().connection
+    if (connection is not None
+            and hasattr(connection, 'set_trace_callback')
+            and connection not in _traced):
+        connection.set_trace_callback(_count_query)
+        _traced[connection] = True
+    return getattr(_local, 'queries', 0)
+
+
+def instrumented(name):
+    "Decorator recording calls, latency and queries of the function"
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            queries = _query_count()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                queries = _query_count() - queries
+                with _lock:
+                    _calls[name] += 1
+                    _durations[name].append(duration)
+                    _cumulative[name] += duration
+                    _queries[name] += queries
+        return wrapper
+    return decorator
+
+
+def record_cache(name, hit):
+    "Record a hit or a miss of the cache"
+    if ENABLED:
+        with _lock:
+            _caches[name][0 if hit else 1] += 1
+
+
+def _percentile(values, percent):
+    index = int(round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def stats():
+    "Return the list of the statistics recorded"
+    result = []
+    with _lock:
+        for name in sorted(_calls):
+            durations = sorted(_durations[name])
+            result.append({
+                    'name': name,
+                    'calls': _calls[name],
+                    'cumulative': _cumulative[name],
+                    'p50': _percentile(durations, 50),
+                    'p95': _percentile(durations, 95),
+                    'p99': _percentile(durations, 99),
+                    'queries': _queries[name],
+                    })
+        for name in sorted(_caches):
+            hit, miss = _caches[name]
+            result.append({
+                    'name': name,
+                    'hit': hit,
+                    'miss': miss,
+                    'hit_rate': hit / (hit + miss) if hit + miss else None,
+                    })
+    return result
+
+
+def dump():
+    "Log the statistics recorded"
+    for stat in stats():
+        if 'calls' in stat:
+            logger.info(
+                "%(name)s: %(calls)d calls, %(cumulative).6fs cumulative, "
+                "p50 %(p50).6fs, p95 %(p95).6fs, p99 %(p99).6fs, "
+                "%(queries)d queries", stat)
+        else:
+            logger.info(
+                "%(name)s: %(hit)d hits, %(miss)d misses", stat)
+
+
+if ENABLED:
+    logging.getLogger('trytond.backend.postgresql.database').addHandler(
+        _QueryHandler(level=logging.DEBUG))
+    atexit.register(dump)
@@ -1,24 +1,63 @@
 # The COPYRIGHT file at the top level of this repository contains the full i
 # copyright notices and license terms.
 
-from trytond.model import fields
+import logging
+from collections import defaultdict
+from itertools import islice
+
+from sql import Literal, Null
+from sql.aggregate import Max, Min, Sum
+from sql.conditionals import Case, Coalesce
+from sql.functions import CurrentTimestamp
+
+from trytond import backend
+from trytond.config import config
+from trytond.i18n import gettext
+from trytond.model import Index, ModelSQL, ModelView, fields
 from trytond.pyson import Eval, Bool
 from trytond.pool import PoolMeta, Pool
+from trytond.tools import grouped_slice, reduce_ids
+from trytond.transaction import Transaction
 from decimal import Decimal
 from trytond.modules.product import price_digits
 
+from .exceptions import InformationPendingError, InformationRequiredError
+from .instrument import instrumented
+from .template import _round_half_even
+
 _ZERO = Decimal(0)
 _ROUND = Decimal('.0001')
+_BACKFILL_SIZE = config.getint('account_invoice_information_uom',
+    'backfill_size', default=100000)
+_IMPORT_SIZE = config.getint('account_invoice_information_uom',
+    'import_size', default=1000)
+_RECOMPUTE_SIZE = config.getint('account_invoice_information_uom',
+    'recompute_size', default=1000)
+_TOTAL_FIELDS = {
+    'invoice', 'type', 'info_unit', 'info_quantity', 'info_unit_price'}
+
+logger = logging.getLogger(__name__)
 
 STATES = {
     'invisible': ~Bool(Eval('show_info_unit')),
     }
 
 
+def _clear_cache(Model, ids):
+    "Clear the cached values of records updated in SQL"
+    transaction = Transaction()
+    transaction.counter += 1
+    for cache in transaction.cache.values():
+        if Model.__name__ in cache:
+            cache_cls = cache[Model.__name__]
+            for id_ in ids:
+                cache_cls.pop(id_, None)
+
+
 class InformationUomMixin(object):
     __slots__ = ()
     show_info_unit = fields.Function(fields.Boolean('Show Information UOM'),
-        'on_change_with_show_info_unit')
+        'get_show_info_unit')
     info_unit = fields.Function(fields.Many2One('product.uom',
             'Information UOM', states=STATES),
         'on_change_with_info_unit')
@@ -38,130 +77,622 @@ class InformationUomMixin(object):
             'required': (Bool(Eval('show_info_unit')) &
                 (Eval('type') == 'line')),
             })
-
-    @classmethod
-    def __setup__(cls):
-        super(InformationUomMixin, cls).__setup__()
-        for value in cls.amount.on_change_with:
-            cls.info_quantity.on_change.add(value)
-            cls.info_unit_price.on_change.add(value)
-        for value in list(cls.amount.on_change_with) + ['product', 'quantity',
-                'unit_price', 'unit']:
-            cls.quantity.on_change.add(value)
-            cls.unit.on_change.add(value)
-            cls.unit_price.on_change.add(value)
+    info_ratio = fields.Function(fields.Float('Information Ratio',
+            readonly=True,
+            help="The information quantity of one default UOM of the "
+            "product."),
+        'on_change_with_info_ratio')
+    info_factor = fields.Function(fields.Float('Information Factor',
+            readonly=True,
+            help="The quantity in the default UOM of the product of one "
+            "UOM of the line."),
+        'on_change_with_info_factor')
+    info_unit_factor = fields.Function(fields.Float(
+            'Information UOM Factor', readonly=True,
+            help="The quantity in the information UOM of the line of one "
+            "information UOM of the product."),
+        'on_change_with_info_unit_factor')
 
     @fields.depends('product')
+    def _get_info_template(self):
+        '''
+        Return the template of the product if it uses an information unit
+
+        The information settings come from the cache so the products without
+        information unit do not read the template.
+        '''
+        pool = Pool()
+        Template = pool.get('product.template')
+        if self.product:
+            template, = Template.browse_info([self.product.template.id])
+            if template.use_info_unit:
+                return template
+
+    @fields.depends(methods=['_get_info_template'])
+    def on_change_with_info_ratio(self, name=None):
+        template = self._get_info_template()
+        if template:
+            return template.info_ratio
+
+    @fields.depends('unit', methods=['_get_info_template'])
+    def on_change_with_info_factor(self, name=None):
+        template = self._get_info_template()
+        if template and self.unit:
+            return template._get_uom_factor(self.unit, template.default_uom)
+
+    @fields.depends('info_unit', methods=['_get_info_template'])
+    def on_change_with_info_unit_factor(self, name=None):
+        template = self._get_info_template()
+        if template:
+            return template._get_info_factor(
+                1.0, self.info_unit, template.info_unit)
+
+    @instrumented('account.invoice.line.on_change_with_show_info_unit')
+    @fields.depends(methods=['_get_info_template'])
     def on_change_with_show_info_unit(self, name=None):
-        if self.product and self.product.template.use_info_unit:
-            return True
-        return False
+        return bool(self._get_info_template())
 
-    @fields.depends('product')
+    @classmethod
+    def get_show_info_unit(cls, records, name):
+        pool = Pool()
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        cursor = Transaction().connection.cursor()
+        table = cls.__table__()
+        product = Product.__table__()
+        template = Template.__table__()
+
+        ids = list(map(int, records))
+        result = dict.fromkeys(ids, False)
+        for sub_ids in grouped_slice(ids):
+            cursor.execute(*table.join(product,
+                    condition=table.product == product.id
+                    ).join(template,
+                    condition=product.template == template.id
+                    ).select(table.id,
+                    where=reduce_ids(table.id, sub_ids)
+                    & (template.use_info_unit == Literal(True))))
+            result.update((id_, True) for id_, in cursor)
+        return result
+
+    @classmethod
+    def get_info_templates(cls, records):
+        '''
+        Return the list of templates of the records
+
+        The information fields of the templates are read in batch.
+        '''
+        pool = Pool()
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        product_ids = list({r.product.id for r in records if r.product})
+        template_ids = {p.id: p.template.id
+            for p in Product.browse(product_ids)}
+        ids = list(set(template_ids.values()))
+        templates = dict(zip(ids, Template.browse_info(ids)))
+        return [templates[template_ids[r.product.id]] if r.product else None
+            for r in records]
+
+    @instrumented('account.invoice.line.on_change_with_info_unit')
+    @fields.depends(methods=['_get_info_template'])
     def on_change_with_info_unit(self, name=None):
-        if (self.product and self.product.template.use_info_unit):
-            return self.product.template.info_unit.id
+        template = self._get_info_template()
+        if template:
+            return template.info_unit.id
         return None
 
-    @fields.depends('product', 'quantity', 'unit')
-    def on_change_with_info_quantity(self, name=None):
-        if not self.product or not self.quantity:
+    def _get_info_quantity(self, template):
+        if not self.quantity:
             return
-        return self.product.template.calc_info_quantity(self.quantity, self.unit)
+        return template.calc_info_quantities([self.quantity], self.unit)[0]
 
-    @fields.depends('product', 'info_quantity', 'unit',
-        methods=['on_change_with_amount'])
-    def on_change_info_quantity(self):
-        if not self.product:
+    def _get_info_unit_price(self, template):
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        if self.unit_price is None:
             return
-        qty = self.product.template.calc_quantity(self.info_quantity, self.unit)
-        self.quantity = qty
-        self.amount = self.on_change_with_amount()
+        price = self.unit_price
+        if self.unit and self.unit != template.default_uom:
+            price = Uom.compute_price(self.unit, price, template.default_uom)
+        DIGITS = price_digits[1]
+        info_price, = template.get_info_unit_prices([price], self.info_unit)
+        return info_price.quantize(Decimal(str(10 ** -DIGITS)))
 
-    @fields.depends('product', 'unit_price', 'type', 'product', 'quantity', 'info_unit', 'unit')
-    def on_change_with_info_unit_price(self, name=None):
-        Uom = Pool().get('product.uom')
+    @fields.depends('quantity', 'unit', methods=['_get_info_template'])
+    def on_change_with_info_quantity(self, name=None):
+        template = self._get_info_template()
+        if template:
+            return self._get_info_quantity(template)
 
-        if not self.product or self.unit_price is None or not self.unit:
-            return
+    @fields.depends('unit_price', 'unit', 'info_unit',
+        methods=['_get_info_template'])
+    def on_change_with_info_unit_price(self, name=None):
+        template = self._get_info_template()
+        if template and self.unit:
+            return self._get_info_unit_price(template)
 
-        price = self.unit_price
-        if self.unit and self.unit != self.product.default_uom:
-            price = Uom.compute_price(self.unit, price,
-                self.product.default_uom)
-        DIGITS = price_digits[1]
-        return self.product.template.get_info_unit_price(
-            price, self.info_unit).quantize(Decimal(str(10 ** -DIGITS)))
+    def _recompute_info(self, changed):
+        '''
+        Derive the quantities and prices from the changed field in one pass
 
-    @fields.depends('product', 'info_unit_price', 'unit',
-        methods=['on_change_with_amount'])
-    def on_change_info_unit_price(self):
-        if not self.product or not self.info_unit_price:
-            return
+        The template is resolved once and the amount is computed once when
+        the quantity or the unit price is derived. The information fields of
+        the products without information unit are left empty.
+        The calling on_change must depend on the fields read for the event.
+        '''
+        template = self._get_info_template()
+        if changed == 'product':
+            self.info_unit = self.on_change_with_info_unit()
+        if changed in {'product', 'unit'}:
+            self.info_quantity = self.on_change_with_info_quantity()
+        if changed in {'product', 'unit', 'info_unit'}:
+            self.info_unit_price = self.on_change_with_info_unit_price()
 
-        DIGITS = price_digits[1]
-        self.unit_price = self.product.template.get_unit_price(
-            self.info_unit_price, unit=self.unit).quantize(
-            Decimal(str(10 ** -DIGITS)))
+        if changed == 'quantity':
+            info_quantity = None
+            if template:
+                info_quantity, = template.calc_info_quantities(
+                    [self.quantity], self.unit)
+                if self.unit:
+                    info_quantity = self.unit.round(info_quantity)
+            self.info_quantity = info_quantity
+        elif changed == 'unit_price':
+            self.info_unit_price = (
+                self._get_info_unit_price(template) if template else None)
+        elif changed == 'info_quantity' and template:
+            self.quantity, = template.calc_quantities(
+                [self.info_quantity], self.unit)
+            self.amount = self.on_change_with_amount()
+        elif (changed == 'info_unit_price' and template
+                and self.info_unit_price):
+            DIGITS = price_digits[1]
+            unit_price, = template.get_unit_prices(
+                [self.info_unit_price], self.unit)
+            self.unit_price = unit_price.quantize(Decimal(str(10 ** -DIGITS)))
+            self.amount = self.on_change_with_amount()
 
-        self.amount = self.on_change_with_amount()
+    @fields.depends('product', 'quantity', 'unit', 'unit_price', 'info_unit',
+        methods=['_get_info_template'])
+    def on_change_product(self):
+        super().on_change_product()
+        self._recompute_info('product')
 
-    @fields.depends('product', 'quantity', 'unit')
+    @instrumented('account.invoice.line.on_change_quantity')
+    @fields.depends('product', 'quantity', 'unit',
+        methods=['_get_info_template'])
     def on_change_quantity(self):
         try:
             super().on_change_quantity()
         except:
             pass
+        self._recompute_info('quantity')
 
-        if not self.product:
-            return
-        qty = self.product.template.calc_info_quantity(self.quantity, self.unit)
-        self.info_quantity = self.unit.round(float(qty))
-
-    @fields.depends('product', 'unit_price', 'type', 'product', 'quantity',
-        'unit')
+    @instrumented('account.invoice.line.on_change_unit')
+    @fields.depends('product', 'quantity', 'unit', 'unit_price', 'info_unit',
+        methods=['_get_info_template'])
     def on_change_unit(self):
-        self.info_unit_price = self.on_change_with_info_unit_price()
-        self.info_quantity = self.on_change_with_info_quantity()
+        self._recompute_info('unit')
 
-    @fields.depends('product', 'unit_price', 'info_unit', 'unit')
+    @instrumented('account.invoice.line.on_change_unit_price')
+    @fields.depends('product', 'unit_price', 'unit', 'info_unit',
+        methods=['_get_info_template'])
     def on_change_unit_price(self):
-        Uom = Pool().get('product.uom')
+        self._recompute_info('unit_price')
 
-        if not self.product:
-            return
-        DIGITS=price_digits[1]
-        if self.unit_price is not None:
-            price = self.unit_price
-            if self.unit and self.unit != self.product.default_uom:
-                price = Uom.compute_price(self.unit, price,
-                    self.product.template.default_uom)
-            self.info_unit_price = round(
-                self.product.template.get_info_unit_price(
-                    price, self.info_unit), DIGITS)
-        else:
-            self.info_unit_price = self.unit_price
+    @instrumented('account.invoice.line.on_change_info_unit')
+    @fields.depends('product', 'unit_price', 'unit', 'info_unit',
+        methods=['_get_info_template'])
+    def on_change_info_unit(self):
+        self._recompute_info('info_unit')
+
+    @instrumented('account.invoice.line.on_change_info_quantity')
+    @fields.depends('product', 'info_quantity', 'unit',
+        methods=['_get_info_template', 'on_change_with_amount'])
+    def on_change_info_quantity(self):
+        self._recompute_info('info_quantity')
+
+    @instrumented('account.invoice.line.on_change_info_unit_price')
+    @fields.depends('product', 'info_unit_price', 'unit',
+        methods=['_get_info_template', 'on_change_with_amount'])
+    def on_change_info_unit_price(self):
+        self._recompute_info('info_unit_price')
+
+    @classmethod
+    def get_info_values(cls, lines):
+        '''
+        Return the list of (info_quantity, info_unit_price) of lines
+
+        The lines are converted in batch per template, unit and information
+        unit.
+        '''
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        DIGITS = price_digits[1]
+        exp = Decimal(str(10 ** -DIGITS))
+
+        values = [(None, None)] * len(lines)
+        groups = defaultdict(list)
+        for i, (line, template) in enumerate(
+                zip(lines, cls.get_info_templates(lines))):
+            if not template or not template.use_info_unit:
+                continue
+            key = (template, line.unit, getattr(line, 'info_unit', None))
+            groups[key].append(i)
+
+        for (template, unit, info_unit), indexes in groups.items():
+            info_quantities = template.calc_info_quantities(
+                [lines[i].quantity for i in indexes], unit)
+            info_unit_prices = [None] * len(indexes)
+            if unit:
+                priced = [j for j, i in enumerate(indexes)
+                    if lines[i].unit_price is not None]
+                prices = [lines[indexes[j]].unit_price for j in priced]
+                if unit != template.default_uom:
+                    prices = [Uom.compute_price(unit, p, template.default_uom)
+                        for p in prices]
+                prices = template.get_info_unit_prices(prices, info_unit)
+                for j, price in zip(priced, prices):
+                    info_unit_prices[j] = price.quantize(exp)
+            for j, i in enumerate(indexes):
+                info_quantity = None
+                if lines[i].quantity:
+                    info_quantity = info_quantities[j]
+                values[i] = (info_quantity, info_unit_prices[j])
+        return values
+
+    @classmethod
+    def set_info_values(cls, lines):
+        'Set the information quantity and unit price on lines'
+        for line, (info_quantity, info_unit_price) in zip(
+                lines, cls.get_info_values(lines)):
+            line.info_quantity = info_quantity
+            line.info_unit_price = info_unit_price
+
+    @classmethod
+    def write_info_values(cls, lines):
+        'Store the information quantity and unit price of lines'
+        to_write = defaultdict(list)
+        for line, info_values in zip(lines, cls.get_info_values(lines)):
+            to_write[info_values].append(line)
+        args = []
+        for (info_quantity, info_unit_price), sub_lines in to_write.items():
+            args.extend((sub_lines, {
+                        'info_quantity': info_quantity,
+                        'info_unit_price': info_unit_price,
+                        }))
+        if args:
+            cls.write(*args)
 
 
 class InvoiceLine(InformationUomMixin, metaclass=PoolMeta):
     __name__ = 'account.invoice.line'
+    info_pending = fields.Boolean('Information Pending', readonly=True,
+        help="The information quantity and unit price are computed by a "
+        "queued task.")
 
     @classmethod
     def __setup__(cls):
         super(InvoiceLine, cls).__setup__()
-        for value in cls.amount.on_change_with:
-            if value not in cls.info_quantity.on_change:
-                cls.info_quantity.on_change.add(value)
-            if value not in cls.info_unit_price.on_change:
-                cls.info_unit_price.on_change.add(value)
-        for value in ('invoice_type',):
-            if value not in cls.info_unit_price.on_change:
-                cls.info_unit_price.on_change.add(value)
-                cls.info_unit_price.on_change_with.add(value)
-                cls.info_unit_price.depends.add(value)
+        # Replace the Function field of the mixin as the fields are copied
+        # from their first definition, it is still computed by
+        # on_change_with_info_unit from the product
+        cls.info_unit = fields.Many2One('product.uom', 'Information UOM',
+            ondelete='RESTRICT', readonly=True, states=STATES)
+        # The pending lines are filled by a queued task
+        for field in [cls.info_quantity, cls.info_unit_price]:
+            field.states['required'] &= ~Eval('info_pending', False)
+        t = cls.__table__()
+        cls._sql_indexes.update({
+                Index(t, (t.info_unit, Index.Equality())),
+                Index(t, (t.product, Index.Equality())),
+                })
+
+    @classmethod
+    def __post_setup__(cls):
+        super(InvoiceLine, cls).__post_setup__()
+        # The information fields are set by the on_changes so they are not
+        # computed a second time by on_change_with
+        cls.info_quantity.on_change_with = set()
+        cls.info_unit_price.on_change_with = set()
+
+    @classmethod
+    def __register__(cls, module_name):
+        pool = Pool()
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        cursor = Transaction().connection.cursor()
+        table = cls.__table__()
+        product = Product.__table__()
+        template = Template.__table__()
+        table_h = cls.__table_handler__(module_name)
+
+        fill_info_unit = not table_h.column_exist('info_unit')
+        fill_info_values = not table_h.column_exist('info_quantity')
+
+        super(InvoiceLine, cls).__register__(module_name)
+
+        if fill_info_values:
+            cls._backfill_info_values()
+
+        # Migration from 7.6: store info_unit
+        if fill_info_unit:
+            query = product.join(template,
+                condition=product.template == template.id
+                ).select(template.info_unit,
+                where=(product.id == table.product)
+                & (template.use_info_unit == Literal(True)))
+            cursor.execute(*table.update(
+                    [table.info_unit], [query],
+                    where=table.product != Null))
+
+    @classmethod
+    def _backfill_info_values(cls):
+        '''
+        Fill info_quantity and info_unit_price of the existing lines in SQL
+        mirroring Template.calc_info_quantities and get_info_unit_prices
+        '''
+        pool = Pool()
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        Uom = pool.get('product.uom')
+        cursor = Transaction().connection.cursor()
+        table = cls.__table__()
+        product = Product.__table__()
+        template = Template.__table__()
+        unit = Uom.__table__()
+        default_uom = Uom.__table__()
+        info_unit = Uom.__table__()
+
+        cursor.execute(*table.select(Min(table.id), Max(table.id)))
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return
+
+        # The UoMs converted through their rate like Uom.compute_qty
+        rate_ids = [u.id for u in Uom.search([])
+            if u.accurate_field == 'rate']
+
+        def to_base(value, uom, cast=lambda c: c):
+            return Case(
+                (uom.id.in_(rate_ids or [None]), value / cast(uom.rate)),
+                else_=value * cast(uom.factor))
+
+        def from_base(value, uom, cast=lambda c: c):
+            return Case(
+                (uom.id.in_(rate_ids or [None]), value * cast(uom.rate)),
+                else_=value / cast(uom.factor))
+
+        from_ = (product
+            .join(template, condition=product.template == template.id)
+            .join(default_uom,
+                condition=template.default_uom == default_uom.id)
+            .join(info_unit, condition=template.info_unit == info_unit.id)
+            .join(unit, 'LEFT', condition=unit.id == table.unit))
+        where = product.id == table.product
+
+        quantity = Case(
+            (unit.id == default_uom.id, table.quantity),
+            else_=_round_half_even(
+                from_base(to_base(table.quantity, unit), default_uom)
+                / default_uom.rounding) * default_uom.rounding)
+        info_quantity = _round_half_even(template.info_ratio * quantity
+            / info_unit.rounding) * info_unit.rounding
+        info_quantity = Case(
+            ((table.quantity != Null) & (table.quantity != 0), info_quantity),
+            else_=Null)
+
+        digits = price_digits[1]
+        cast = cls.info_unit_price.sql_cast
+        # Prices are converted the other way than quantities
+        unit_price = Case(
+            (unit.id == default_uom.id, table.unit_price),
+            else_=to_base(from_base(table.unit_price, unit, cast),
+                default_uom, cast))
+        # Rounded to _ROUND and then to the price digits
+        info_unit_price = _round_half_even(_round_half_even(
+                unit_price / cast(template.info_ratio), 4), digits)
+
+        product2 = Product.__table__()
+        template2 = Template.__table__()
+        products = product2.join(template2,
+            condition=product2.template == template2.id
+            ).select(product2.id,
+            where=template2.use_info_unit == Literal(True))
+        for start in range(min_id, max_id + 1, _BACKFILL_SIZE):
+            end = start + _BACKFILL_SIZE
+            cursor.execute(*table.update(
+                    [table.info_quantity, table.info_unit_price],
+                    [from_.select(info_quantity, where=where),
+                        from_.select(info_unit_price, where=where)],
+                    where=(table.id >= start) & (table.id < end)
+                    & (table.type == 'line')
+                    & table.product.in_(products)))
+            logger.info("Filled information fields of invoice lines %s/%s",
+                min(end - min_id, max_id - min_id + 1),
+                max_id - min_id + 1)
+
+    @classmethod
+    def preprocess_values(cls, mode, values):
+        pool = Pool()
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        values = super().preprocess_values(mode, values)
+        if 'product' in values and 'info_unit' not in values:
+            info_unit = None
+            if values['product'] is not None:
+                template, = Template.browse_info(
+                    [Product(values['product']).template.id])
+                if template.use_info_unit:
+                    info_unit = template.info_unit.id
+            values['info_unit'] = info_unit
+        return values
+
+    @classmethod
+    def update_info_values(cls, lines):
+        '''
+        Refresh the information unit and fields of the draft lines from their
+        product
+        '''
+        lines = [l for l in lines
+            if l.type == 'line' and l.invoice_state == 'draft']
+        to_write = defaultdict(list)
+        for line, template in zip(lines, cls.get_info_templates(lines)):
+            info_unit = None
+            if template and template.use_info_unit:
+                info_unit = template.info_unit.id
+            if (line.info_unit.id if line.info_unit else None) != info_unit:
+                to_write[info_unit].append(line)
+        args = []
+        for info_unit, sub_lines in to_write.items():
+            args.extend((sub_lines, {'info_unit': info_unit}))
+        if args:
+            cls.write(*args)
+        cls.write_info_values(lines)
+
+    @classmethod
+    def import_info_lines(cls, rows, size=None):
+        '''
+        Create lines from an iterable of values priced in information unit
+        and return the number of lines created
+
+        The rows are consumed by chunks of size. For each chunk, the products
+        and units are read once and the quantity and unit price are derived
+        in batch from info_quantity and info_unit_price per template and unit.
+        '''
+        pool = Pool()
+        Product = pool.get('product.product')
+        Uom = pool.get('product.uom')
+
+        count = 0
+        rows = iter(rows)
+        while True:
+            vlist = [v.copy() for v in islice(rows, size or _IMPORT_SIZE)]
+            if not vlist:
+                break
+            products = Product.browse(
+                list({v['product'] for v in vlist if v.get('product')}))
+            products = {p.id: p for p in products}
+            units = Uom.browse(
+                list({v['unit'] for v in vlist if v.get('unit')}))
+            units = {u.id: u for u in units}
+
+            groups = defaultdict(list)
+            for values in vlist:
+                product = products.get(values.get('product'))
+                if not product:
+                    continue
+                template = product.template
+                unit = units.get(values.get('unit'))
+                if not unit:
+                    unit = template.default_uom
+                    values['unit'] = unit.id
+                if template.use_info_unit:
+                    groups[(template, unit)].append(values)
+
+            for (template, unit), sub_vlist in groups.items():
+                quantified = [v for v in sub_vlist if 'info_quantity' in v]
+                quantities = template.calc_quantities(
+                    [v['info_quantity'] for v in quantified], unit)
+                for values, quantity in zip(quantified, quantities):
+                    values['quantity'] = quantity
+                priced = [v for v in sub_vlist if v.get('info_unit_price')]
+                prices = template.get_unit_prices(
+                    [v['info_unit_price'] for v in priced], unit)
+                for values, price in zip(priced, prices):
+                    values['unit_price'] = price
+
+            cls.create(vlist)
+            count += len(vlist)
+        return count
+
+    @staticmethod
+    def default_info_pending():
+        return False
+
+    @classmethod
+    def fill_pending_info_values(cls, lines):
+        'Fill the information fields of the lines created pending'
+        lines = [l for l in lines if l.info_pending]
+        cls.set_info_values(lines)
+        for line in lines:
+            line.info_pending = False
+        cls.save(lines)
+
+    @classmethod
+    def on_modification(cls, mode, lines, field_names=None):
+        pool = Pool()
+        Total = pool.get('account.invoice.information_uom.total')
+        super(InvoiceLine, cls).on_modification(
+            mode, lines, field_names=field_names)
+        # The totals of the credit lines are updated by credit_info_values
+        if ((mode == 'create'
+                    and not Transaction().context.get('_info_uom_credit'))
+                or (mode == 'write' and field_names & _TOTAL_FIELDS)):
+            Total.update_totals({l.invoice.id for l in lines if l.invoice})
+        if mode == 'create':
+            pending = [l for l in lines if l.info_pending]
+            for sub_lines in grouped_slice(pending, _RECOMPUTE_SIZE):
+                cls.__queue__.fill_pending_info_values(list(sub_lines))
+
+    @classmethod
+    def on_write(cls, lines, values):
+        pool = Pool()
+        Total = pool.get('account.invoice.information_uom.total')
+        callback = super(InvoiceLine, cls).on_write(lines, values)
+        if 'invoice' in values:
+            invoice_ids = {l.invoice.id for l in lines if l.invoice}
+            if invoice_ids:
+                callback.append(lambda: Total.update_totals(invoice_ids))
+        return callback
+
+    @classmethod
+    def on_delete(cls, lines):
+        pool = Pool()
+        Total = pool.get('account.invoice.information_uom.total')
+        callback = super(InvoiceLine, cls).on_delete(lines)
+        invoice_ids = {l.invoice.id for l in lines if l.invoice}
+        if invoice_ids:
+            callback.append(lambda: Total.update_totals(invoice_ids))
+        return callback
+
+    @classmethod
+    def _after_create(cls, ids):
+        # Copy the values before the validation of the required fields
+        if Transaction().context.get('_info_uom_credit'):
+            cls.credit_info_values(cls.browse(ids))
+        return super(InvoiceLine, cls)._after_create(ids)
+
+    @classmethod
+    def credit_info_values(cls, lines):
+        '''
+        Copy the information fields of the credited lines to the credit lines
+        in SQL
+        '''
+        pool = Pool()
+        Total = pool.get('account.invoice.information_uom.total')
+        cursor = Transaction().connection.cursor()
+        table = cls.__table__()
+        origin = cls.__table__()
+
+        origin_id = cls.origin.sql_id(table.origin, cls)
+        ids = [l.id for l in lines]
+        for sub_ids in grouped_slice(ids):
+            cursor.execute(*table.update(
+                    [table.info_unit_price, table.info_quantity],
+                    [origin.select(origin.info_unit_price,
+                            where=origin.id == origin_id),
+                        origin.select(-origin.info_quantity,
+                            where=origin.id == origin_id)],
+                    where=reduce_ids(table.id, sub_ids)
+                    & table.origin.like(cls.__name__ + ',%')))
+        _clear_cache(cls, ids)
+        Total.update_totals({l.invoice.id for l in lines if l.invoice})
 
     def _credit(self):
         line = super(InvoiceLine, self)._credit()
+        if Transaction().context.get('_info_uom_credit'):
+            # The values are copied by credit_info_values
+            return line
         if self.info_unit_price is not None:
             line.info_unit_price = self.info_unit_price
 
@@ -170,3 +701,147 @@ class InvoiceLine(InformationUomMixin, metaclass=PoolMeta):
         else:
             line.info_unit_price = self.info_unit_price
         return line
+
+
+class Invoice(metaclass=PoolMeta):
+    __name__ = 'account.invoice'
+    info_totals = fields.One2Many('account.invoice.information_uom.total',
+        'invoice', 'Information UOM Totals', readonly=True)
+
+    @classmethod
+    def credit(cls, invoices, refund=False, **values):
+        with Transaction().set_context(_info_uom_credit=True):
+            return super(Invoice, cls).credit(
+                invoices, refund=refund, **values)
+
+    @classmethod
+    def check_info_required(cls, invoices):
+        '''
+        Check the information fields of the lines of the invoices
+
+        The lines are checked in SQL and all the offending lines are
+        reported at once unless some lines are still pending.
+        '''
+        pool = Pool()
+        InvoiceLine = pool.get('account.invoice.line')
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        cursor = Transaction().connection.cursor()
+        line = InvoiceLine.__table__()
+        product = Product.__table__()
+        template = Template.__table__()
+
+        pending = Coalesce(line.info_pending, Literal(False)) == Literal(True)
+        missing = ((template.use_info_unit == Literal(True))
+            & (((line.info_quantity == Null)
+                    & (Coalesce(line.quantity, 0) != 0))
+                | ((line.info_unit_price == Null)
+                    & (line.unit_price != Null))))
+        line_ids = []
+        for sub_ids in grouped_slice(list(map(int, invoices))):
+            cursor.execute(*line.join(product, 'LEFT',
+                    condition=line.product == product.id
+                    ).join(template, 'LEFT',
+                    condition=product.template == template.id
+                    ).select(line.invoice, line.id, pending,
+                    where=reduce_ids(line.invoice, sub_ids)
+                    & (line.type == 'line')
+                    & (pending | missing),
+                    order_by=[line.invoice, line.id]))
+            for invoice_id, line_id, line_pending in cursor:
+                if line_pending:
+                    raise InformationPendingError(
+                        gettext('account_invoice_information_uom'
+                            '.msg_invoice_info_pending',
+                            invoice=cls(invoice_id).rec_name))
+                line_ids.append(line_id)
+        if line_ids:
+            lines = InvoiceLine.browse(line_ids)
+            raise InformationRequiredError(
+                gettext('account_invoice_information_uom'
+                    '.msg_invoice_line_info_required',
+                    lines=', '.join(l.rec_name for l in lines)))
+
+    @classmethod
+    def validate_invoice(cls, invoices):
+        cls.check_info_required(invoices)
+        super(Invoice, cls).validate_invoice(invoices)
+
+    @classmethod
+    def _post(cls, invoices):
+        cls.check_info_required(invoices)
+        super(Invoice, cls)._post(invoices)
+
+
+class InvoiceInformationUomTotal(ModelSQL, ModelView):
+    'Invoice Information UOM Total'
+    __name__ = 'account.invoice.information_uom.total'
+    invoice = fields.Many2One('account.invoice', 'Invoice', required=True,
+        ondelete='CASCADE')
+    info_unit = fields.Many2One('product.uom', 'Information UOM',
+        required=True, ondelete='RESTRICT')
+    info_quantity = fields.Float('Information Quantity', digits='info_unit')
+    info_amount = fields.Numeric('Information Amount', digits=price_digits)
+
+    @classmethod
+    def __setup__(cls):
+        super(InvoiceInformationUomTotal, cls).__setup__()
+        t = cls.__table__()
+        cls._sql_indexes.add(Index(t, (t.invoice, Index.Equality())))
+        cls.__access__.add('invoice')
+
+    @classmethod
+    def __register__(cls, module_name):
+        created = not backend.TableHandler.table_exist(cls._table)
+
+        super(InvoiceInformationUomTotal, cls).__register__(module_name)
+
+        if created:
+            cls.update_totals()
+
+    @classmethod
+    def update_totals(cls, invoice_ids=None):
+        """
+        Compute in SQL the totals of the invoices from their lines
+
+        The totals of all the invoices are computed if invoice_ids is None.
+        """
+        pool = Pool()
+        Invoice = pool.get('account.invoice')
+        InvoiceLine = pool.get('account.invoice.line')
+        transaction = Transaction()
+        cursor = transaction.connection.cursor()
+        table = cls.__table__()
+        line = InvoiceLine.__table__()
+
+        if invoice_ids is None:
+            slices = [None]
+        else:
+            if not invoice_ids:
+                return
+            slices = (list(s) for s in grouped_slice(invoice_ids))
+        for sub_ids in slices:
+            where = ((line.type == 'line')
+                & (line.invoice != Null)
+                & (line.info_unit != Null))
+            if sub_ids is None:
+                cursor.execute(*table.delete())
+            else:
+                cursor.execute(*table.delete(
+                        where=reduce_ids(table.invoice, sub_ids)))
+                where &= reduce_ids(line.invoice, sub_ids)
+            cursor.execute(*table.insert([
+                        table.create_uid, table.create_date,
+                        table.invoice, table.info_unit,
+                        table.info_quantity, table.info_amount,
+                        ],
+                    line.select(
+                        Literal(transaction.user), CurrentTimestamp(),
+                        line.invoice, line.info_unit,
+                        Sum(line.info_quantity),
+                        cls.info_amount.sql_cast(
+                            Sum(line.info_unit_price * line.info_quantity)),
+                        where=where,
+                        group_by=[line.invoice, line.info_unit])))
+            if sub_ids is not None:
+                _clear_cache(Invoice, sub_ids)
@@ -0,0 +1,75 @@
+# The COPYRIGHT file at the top level of this repository contains the full
+# copyright notices and license terms.
+from sql import Null
+from sql.aggregate import Min, Sum
+
+from trytond.model import ModelSQL, ModelView, fields
+from trytond.modules.currency.fields import Monetary
+from trytond.pool import Pool
+from trytond.pyson import Eval
+
+
+class InvoiceLineInformationUom(ModelSQL, ModelView):
+    'Invoice Line Information UOM'
+    __name__ = 'account.invoice.line.information_uom'
+    company = fields.Many2One('company.company', 'Company')
+    period = fields.Many2One('account.period', 'Period')
+    invoice_type = fields.Selection([
+            ('out', "Customer"),
+            ('in', "Supplier"),
+            ], 'Type')
+    party = fields.Many2One('party.party', 'Party',
+        context={
+            'company': Eval('company', -1),
+            },
+        depends={'company'})
+    product = fields.Many2One('product.product', 'Product',
+        context={
+            'company': Eval('company', -1),
+            },
+        depends={'company'})
+    info_unit = fields.Many2One('product.uom', 'Information UOM')
+    info_quantity = fields.Float('Information Quantity', digits='info_unit')
+    info_amount = Monetary('Information Amount', currency='currency',
+        digits='currency')
+    currency = fields.Many2One('currency.currency', 'Currency')
+
+    @classmethod
+    def __setup__(cls):
+        super(InvoiceLineInformationUom, cls).__setup__()
+        cls._order.insert(0, ('period', 'DESC'))
+        cls._order.insert(1, ('product', 'ASC'))
+
+    @classmethod
+    def table_query(cls):
+        pool = Pool()
+        Invoice = pool.get('account.invoice')
+        InvoiceLine = pool.get('account.invoice.line')
+        Move = pool.get('account.move')
+        invoice = Invoice.__table__()
+        line = InvoiceLine.__table__()
+        move = Move.__table__()
+
+        return line.join(invoice, condition=line.invoice == invoice.id
+            ).join(move, condition=invoice.move == move.id
+            ).select(
+                Min(line.id).as_('id'),
+                invoice.company.as_('company'),
+                move.period.as_('period'),
+                invoice.type.as_('invoice_type'),
+                invoice.party.as_('party'),
+                line.product.as_('product'),
+                line.info_unit.as_('info_unit'),
+                invoice.currency.as_('currency'),
+                Sum(line.info_quantity).as_('info_quantity'),
+                cls.info_amount.sql_cast(
+                    Sum(line.info_unit_price * line.info_quantity)
+                    ).as_('info_amount'),
+                where=(line.type == 'line')
+                & (line.info_unit != Null)
+                & invoice.state.in_(['posted', 'paid']),
+                group_by=[
+                    invoice.company, move.period, invoice.type,
+                    invoice.party, line.product, line.info_unit,
+                    invoice.currency,
+                    ])
@@ -1,15 +1,47 @@
 # The COPYRIGHT file at the top level of this repository contains the full i
 # copyright notices and license terms.
-from trytond.pool import PoolMeta
+from trytond.config import config
+from trytond.pool import Pool, PoolMeta
+from trytond.transaction import Transaction
+
+from .instrument import instrumented
+
+_DEFER = config.getboolean('account_invoice_information_uom',
+    'defer_sale_invoice', default=False)
+
+
+class Sale(metaclass=PoolMeta):
+    __name__ = 'sale.sale'
+
+    def create_invoice(self):
+        pool = Pool()
+        InvoiceLine = pool.get('account.invoice.line')
+        with Transaction().set_context(_info_uom_batch=True):
+            invoice = super().create_invoice()
+        if invoice:
+            lines = [l for l in invoice.lines if l.id is None or l.id < 0]
+            if _DEFER:
+                # The values are filled by a queued task once saved
+                for line, template in zip(
+                        lines, InvoiceLine.get_info_templates(lines)):
+                    if template and template.use_info_unit:
+                        line.info_pending = True
+            else:
+                InvoiceLine.set_info_values(lines)
+        return invoice
 
 
 class SaleLine(metaclass=PoolMeta):
     __name__ = 'sale.line'
 
+    @instrumented('sale.line.get_invoice_line')
     def get_invoice_line(self):
         invoice_line = super().get_invoice_line()
         if not invoice_line:
             return invoice_line
         invoice_line, = invoice_line
-        invoice_line.on_change_unit()
+        # The information fields are filled for all the lines of the invoice
+        # by Sale.create_invoice
+        if not Transaction().context.get('_info_uom_batch'):
+            invoice_line.on_change_unit()
         return [invoice_line]
@@ -1,96 +1,342 @@
 # The COPYRIGHT file at the top level of this repository contains the full
 # copyright notices and license terms.
-from trytond.model import fields
-from trytond.pyson import Eval, Bool, Not
+from collections import defaultdict
+from weakref import WeakKeyDictionary
+
+from sql import Cast, Literal, Null
+from sql.conditionals import Case
+from sql.functions import Abs, Round, Trunc
+
+from trytond.cache import Cache, LRUDict
+from trytond.config import config
+from trytond.model import Index, fields
 from trytond.pool import Pool, PoolMeta
+from trytond.tools import grouped_slice, reduce_ids
+from trytond.transaction import Transaction
 from decimal import Decimal
 from trytond.modules.product import price_digits
 
+from .instrument import instrumented, record_cache
 
-__all__ = ['Template']
+
+__all__ = ['Template', 'ListPrice']
 
 _ZERO = Decimal(0)
 _ROUND = Decimal('.0001')
+_FACTOR_CACHE_SIZE = config.getint('cache', 'product.uom.factor',
+    default=1024)
+_factor_cache = WeakKeyDictionary()
+_RECOMPUTE_SIZE = config.getint('account_invoice_information_uom',
+    'recompute_size', default=1000)
+_INFO_FIELDS = {'use_info_unit', 'info_unit', 'info_ratio', 'default_uom'}
+_INFO_LIST_PRICE_FIELDS = {'use_info_unit', 'info_ratio', 'default_uom'}
+_info_cache = Cache('product.template.information_uom', context=False)
+
+
+def clear_factor_cache():
+    "Clear the UoM factors cached by the current transaction"
+    _factor_cache.pop(Transaction(), None)
+
+
+def _round_half_even(value, digits=0):
+    "Return the SQL expression of value rounded half to even like Python"
+    # The SQL Round rounds the halves away from zero
+    if not digits:
+        # PostgreSQL rounds double precision only without digits
+        return Case(
+            (Abs(value - Trunc(value)) == 0.5, Round(value / 2) * 2),
+            else_=Round(value))
+    value = Cast(value, 'NUMERIC')
+    scale = 10 ** digits
+    scaled = value * scale
+    return Case(
+        (Abs(scaled - Trunc(scaled)) == 0.5, Round(scaled / 2) * 2 / scale),
+        else_=Round(value, digits))
 
 
 class Template(metaclass=PoolMeta):
     __name__ = "product.template"
-    use_info_unit = fields.Boolean('Use Information UOM')
-    info_unit = fields.Many2One('product.uom', 'Information UOM',
-        states={
-            'required': Bool(Eval('use_info_unit'))
-            })
-    info_list_price = fields.Function(fields.Numeric('Information List Price',
-            digits=(16, 8)),
-        'on_change_with_info_list_price')
-    info_ratio = fields.Float('Information Ratio', digits=(16, 4),
-        states={
-            'required': Bool(Eval('use_info_unit')),
-            },
-        domain=['OR',
-            [('info_ratio', '=', None)],
-            [('info_ratio', '!=', 0.0)],
-                ])
 
     @classmethod
-    def view_attributes(cls):
-        return super(Template, cls).view_attributes() + [
-            ('//page[@id="information_uom"]', 'states', {
-                    'invisible': Not(Bool(Eval('use_info_unit'))),
-                    })]
-
-    @fields.depends('default_uom')
-    def _compute_factor(self, factor=1.0, unit=None, base_unit=None):
+    def __setup__(cls):
+        super().__setup__()
+        cls.info_list_price.getter = 'get_info_list_price_stored'
+        cls.info_list_price.searcher = 'search_info_list_price'
+
+    @classmethod
+    def get_info_list_price_stored(cls, templates, name):
+        '''
+        Return the information list prices stored for the context company
+
+        The templates without stored value are computed in Python.
+        '''
+        pool = Pool()
+        ListPrice = pool.get('product.list_price')
+        cursor = Transaction().connection.cursor()
+        table = ListPrice.__table__()
+        company = Transaction().context.get('company')
+
+        prices = {}
+        if company is not None:
+            for sub_ids in grouped_slice(list(map(int, templates))):
+                cursor.execute(*table.select(
+                        table.template, table.info_list_price,
+                        where=reduce_ids(table.template, sub_ids)
+                        & (table.company == company)
+                        & (table.info_list_price != Null)))
+                prices.update(cursor)
+        for template in templates:
+            if template.id in prices:
+                prices[template.id] = Decimal(
+                    str(prices[template.id])).quantize(_ROUND)
+            else:
+                prices[template.id] = template.on_change_with_info_list_price()
+        return prices
+
+    @classmethod
+    def search_info_list_price(cls, name, clause):
+        pool = Pool()
+        ListPrice = pool.get('product.list_price')
+        table = ListPrice.__table__()
+        company = Transaction().context.get('company')
+
+        _, operator, value = clause
+        expression = ListPrice.info_list_price.convert_domain(
+            ('info_list_price', operator, value), {None: (table, None)},
+            ListPrice)
+        query = table.select(table.template,
+            where=(table.company == company) & expression)
+        return [('id', 'in', query)]
+
+    @classmethod
+    def order_info_list_price(cls, tables):
+        pool = Pool()
+        ListPrice = pool.get('product.list_price')
+        table, _ = tables[None]
+        if 'info_list_price' not in tables:
+            list_price = ListPrice.__table__()
+            company = Transaction().context.get('company')
+            tables['info_list_price'] = {
+                None: (list_price,
+                    (list_price.template == table.id)
+                    & (list_price.company == company)),
+                }
+        list_price, _ = tables['info_list_price'][None]
+        return [list_price.info_list_price]
+
+    @classmethod
+    def browse_info(cls, ids):
+        '''
+        Return the templates of ids with their information UOM settings
+
+        The settings are cached across transactions.
+        '''
+        values = {}
+        missing = []
+        for id_ in ids:
+            value = _info_cache.get(id_)
+            if value is None:
+                missing.append(id_)
+            else:
+                values[id_] = value
+        if missing:
+            for value in cls.read(missing, sorted(_INFO_FIELDS)):
+                id_ = value.pop('id')
+                values[id_] = value
+                _info_cache.set(id_, value)
+        return [cls(id_, **values[id_]) for id_ in ids]
+
+    @classmethod
+    def on_modification(cls, mode, templates, field_names=None):
+        pool = Pool()
+        ListPrice = pool.get('product.list_price')
+        super().on_modification(mode, templates, field_names=field_names)
+        if mode == 'delete' or (
+                mode == 'write' and field_names & _INFO_FIELDS):
+            _info_cache.clear()
+        if mode == 'write' and field_names & _INFO_FIELDS:
+            cls.__queue__.update_info_invoice_lines(templates)
+        if mode == 'write' and field_names & _INFO_LIST_PRICE_FIELDS:
+            ListPrice.update_info_list_price(ListPrice.search([
+                        ('template', 'in', [t.id for t in templates]),
+                        ]))
+
+    @classmethod
+    def update_info_invoice_lines(cls, templates):
+        '''
+        Recompute the information fields of the draft invoice lines of the
+        templates in chunks queued
+        '''
+        pool = Pool()
+        InvoiceLine = pool.get('account.invoice.line')
+        lines = InvoiceLine.search([
+                ('product.template', 'in', [t.id for t in templates]),
+                ('type', '=', 'line'),
+                ['OR',
+                    ('invoice', '=', None),
+                    ('invoice.state', '=', 'draft'),
+                    ],
+                ], order=[('id', 'ASC')])
+        for sub_lines in grouped_slice(lines, _RECOMPUTE_SIZE):
+            InvoiceLine.__queue__.update_info_values(list(sub_lines))
+
+    @classmethod
+    def _get_uom_factor(cls, from_uom, to_uom):
+        """
+        Return the factor to convert a quantity from from_uom to to_uom
+
+        The factors are cached for the duration of the transaction.
+        """
         pool = Pool()
         Uom = pool.get('product.uom')
+        transaction = Transaction()
+        cache = _factor_cache.get(transaction)
+        if cache is None:
+            cache = _factor_cache[transaction] = LRUDict(_FACTOR_CACHE_SIZE)
+        key = (from_uom.id, to_uom.id)
+        try:
+            factor = cache[key]
+            record_cache('product.uom.factor', True)
+            return factor
+        except KeyError:
+            record_cache('product.uom.factor', False)
+            factor = cache[key] = Uom.compute_qty(from_uom, 1.0, to_uom,
+                round=False)
+            return factor
+
+    def _get_info_factor(self, factor=1.0, unit=None, base_unit=None):
+        "Same as _compute_factor with the UOM factors cached"
         if not base_unit:
             base_unit = self.default_uom
-        if unit:
-            factor = Uom.compute_qty(base_unit, factor, unit)
+        if unit and factor:
+            factor = unit.round(
+                factor * self._get_uom_factor(base_unit, unit))
         return factor
 
-    def calc_info_quantity(self, qty, unit=None):
-        Uom = Pool().get('product.uom')
-        if not self.use_info_unit or not qty:
-            return 0.0
+    @instrumented('product.template.calc_info_quantities')
+    def calc_info_quantities(self, quantities, unit=None):
+        "Return the information quantities of the quantities in unit"
+        if not self.use_info_unit:
+            return [0.0] * len(quantities)
+        ratio = self.info_ratio
+        info_round = self.info_unit.round
         if unit and unit != self.default_uom:
-            qty = Uom.compute_qty(unit, qty, self.default_uom)
-        return self.info_unit.round(self.info_ratio * qty)
-
-    def calc_quantity(self, info_qty, unit=None):
-        Uom = Pool().get('product.uom')
-        if not info_qty or not self.use_info_unit:
-            return 0.0
-        info_qty = Uom.compute_qty(self.default_uom, float(info_qty), unit)
-        return self.default_uom.round(info_qty / self.info_ratio)
-
-    @fields.depends('use_info_unit', 'info_ratio', 'default_uom',
-        'list_price')
-    def get_info_list_price(self, unit=None):
-        factor = self._compute_factor()
+            factor = self._get_uom_factor(unit, self.default_uom)
+            default_round = self.default_uom.round
+            return [info_round(ratio * default_round(q * factor)) if q else 0.0
+                for q in quantities]
+        return [info_round(ratio * q) if q else 0.0 for q in quantities]
+
+    @instrumented('product.template.calc_quantities')
+    def calc_quantities(self, info_quantities, unit=None):
+        "Return the quantities in unit of the information quantities"
+        if not self.use_info_unit:
+            return [0.0] * len(info_quantities)
+        ratio = self.info_ratio
+        default_round = self.default_uom.round
+        if unit:
+            factor = self._get_uom_factor(self.default_uom, unit)
+            unit_round = unit.round
+            return [
+                default_round(unit_round(float(q) * factor) / ratio)
+                if q else 0.0 for q in info_quantities]
+        return [default_round(float(q) / ratio) if q else 0.0
+            for q in info_quantities]
+
+    def compute_info_list_price(self, list_price):
+        "Return the information list price of list_price"
+        factor = self._get_info_factor()
         price = _ZERO
-        if self.use_info_unit and self.info_ratio and self.list_price:
-            price = (self.list_price / Decimal(str(self.info_ratio))).quantize(
+        if self.use_info_unit and self.info_ratio and list_price:
+            price = (list_price / Decimal(str(self.info_ratio))).quantize(
                 _ROUND)
         return (price / Decimal(str(factor))).quantize(_ROUND)
 
-    def get_unit_price(self, info_price, unit=None):
-        price = _ZERO
-        factor = self._compute_factor(1.0, unit)
-        if self.use_info_unit:
-            price = (info_price * Decimal(str(self.info_ratio))).quantize(
-                _ROUND)
-        return (price / Decimal(str(factor))).quantize(
-            Decimal('10')**-price_digits[1])
+    @instrumented('product.template.get_unit_prices')
+    def get_unit_prices(self, info_prices, unit=None):
+        "Return the unit prices in unit of the information prices"
+        exp = Decimal('10')**-price_digits[1]
+        factor = Decimal(str(self._get_info_factor(1.0, unit)))
+        if not self.use_info_unit:
+            return [(_ZERO / factor).quantize(exp)] * len(info_prices)
+        ratio = Decimal(str(self.info_ratio))
+        return [((p * ratio).quantize(_ROUND) / factor).quantize(exp)
+            for p in info_prices]
 
-    def get_info_unit_price(self, unit_price, unit=None):
-        price = _ZERO
-        factor = self._compute_factor(1.0, unit, self.info_unit)
-        if self.use_info_unit:
-            price = (unit_price / Decimal(str(self.info_ratio))).quantize(
-                _ROUND)
-        return (price * Decimal(str(factor))).quantize(_ROUND)
+    @instrumented('product.template.get_info_unit_prices')
+    def get_info_unit_prices(self, unit_prices, unit=None):
+        "Return the information prices in unit of the unit prices"
+        factor = Decimal(str(
+                self._get_info_factor(1.0, unit, self.info_unit)))
+        if not self.use_info_unit:
+            return [(_ZERO * factor).quantize(_ROUND)] * len(unit_prices)
+        ratio = Decimal(str(self.info_ratio))
+        prices = [(p / ratio).quantize(_ROUND) for p in unit_prices]
+        if factor != 1:
+            prices = [(p * factor).quantize(_ROUND) for p in prices]
+        return prices
 
-    @fields.depends(methods=['get_info_list_price'])
-    def on_change_with_info_list_price(self, name=None):
-        return self.get_info_list_price()
+
+class ListPrice(metaclass=PoolMeta):
+    __name__ = 'product.list_price'
+    info_list_price = fields.Numeric('Information List Price',
+        digits=(16, 8), readonly=True)
+
+    @classmethod
+    def __setup__(cls):
+        super().__setup__()
+        t = cls.__table__()
+        cls._sql_indexes.add(
+            Index(t,
+                (t.company, Index.Equality()),
+                (t.info_list_price, Index.Range())))
+
+    @classmethod
+    def __register__(cls, module_name):
+        pool = Pool()
+        Template = pool.get('product.template')
+        cursor = Transaction().connection.cursor()
+        table = cls.__table__()
+        template = Template.__table__()
+        table_h = cls.__table_handler__(module_name)
+
+        fill_info_list_price = not table_h.column_exist('info_list_price')
+
+        super().__register__(module_name)
+
+        if fill_info_list_price:
+            # Same as compute_info_list_price with the default UoM
+            price = cls.info_list_price.sql_cast(table.list_price
+                / cls.info_list_price.sql_cast(template.info_ratio))
+            query = template.select(
+                Case(((template.use_info_unit == Literal(True))
+                        & (template.info_ratio != 0)
+                        & (table.list_price != 0),
+                        _round_half_even(price, 4)),
+                    else_=0),
+                where=template.id == table.template)
+            cursor.execute(*table.update(
+                    [table.info_list_price], [query]))
+
+    @classmethod
+    def on_modification(cls, mode, list_prices, field_names=None):
+        super().on_modification(mode, list_prices, field_names=field_names)
+        if (mode == 'create'
+                or (mode == 'write'
+                    and field_names & {'list_price', 'template'})):
+            cls.update_info_list_price(list_prices)
+
+    @classmethod
+    def update_info_list_price(cls, list_prices):
+        "Store the information list price of the list prices"
+        to_write = defaultdict(list)
+        for list_price in list_prices:
+            value = list_price.template.compute_info_list_price(
+                list_price.list_price)
+            if list_price.info_list_price != value:
+                to_write[value].append(list_price)
+        args = []
+        for value, sub_list_prices in to_write.items():
+            args.extend((sub_list_prices, {'info_list_price': value}))
+        if args:
+            cls.write(*args)
@@ -0,0 +1,303 @@
+# The COPYRIGHT file at the top level of this repository contains the full
+# copyright notices and license terms.
+"""
+Benchmark of the information UOM on_change and invoicing paths
+
+It is not part of the test suite, run it with:
+
+    python -m trytond.modules.account_invoice_information_uom.tests.benchmark
+
+The database is set up with DB_NAME and TRYTOND_DATABASE_URI like the test
+suite (SQLite in memory by default). Query counts are only reported on
+SQLite.
+
+With --compare, a product without information unit is benchmarked against
+the plain account_invoice module.
+"""
+import argparse
+import datetime
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+
+from proteus import Model
+from trytond.modules.account.tests.tools import (
+    create_chart, create_fiscalyear, get_accounts)
+from trytond.modules.account_invoice.tests.tools import (
+    create_payment_term, set_fiscalyear_invoice_sequences)
+from trytond.modules.company.tests.tools import create_company, get_company
+from trytond.pool import Pool
+from trytond.tests.test_tryton import DB_NAME, USER
+from trytond.tests.tools import activate_modules
+from trytond.transaction import Transaction
+
+SIZES = [10, 1000, 100000]
+
+
+def setup(modules=('account_invoice_information_uom', 'sale'),
+        use_info_unit=True):
+    "Activate the modules and create the master data"
+    activate_modules(list(modules))
+
+    _ = create_company()
+    company = get_company()
+    fiscalyear = set_fiscalyear_invoice_sequences(
+        create_fiscalyear(company))
+    fiscalyear.click('create_period')
+    _ = create_chart(company)
+    accounts = get_accounts(company)
+
+    Party = Model.get('party.party')
+    party = Party(name='Party')
+    party.save()
+
+    ProductCategory = Model.get('product.category')
+    account_category = ProductCategory(name="Account Category")
+    account_category.accounting = True
+    account_category.account_expense = accounts['expense']
+    account_category.account_revenue = accounts['revenue']
+    account_category.save()
+
+    ProductUom = Model.get('product.uom')
+    unit, = ProductUom.find([('name', '=', 'Unit')])
+    kg, = ProductUom.find([('name', '=', 'Kilogram')])
+    ProductTemplate = Model.get('product.template')
+    template = ProductTemplate()
+    template.name = 'product'
+    template.default_uom = unit
+    template.type = 'service'
+    template.list_price = Decimal('40')
+    template.account_category = account_category
+    if 'account_invoice_information_uom' in modules and use_info_unit:
+        template.use_info_unit = True
+        template.info_unit = kg
+        template.info_ratio = Decimal('2')
+    if 'sale' in modules:
+        template.salable = True
+    template.save()
+    product, = template.products
+
+    payment_term = create_payment_term()
+    payment_term.save()
+    return {
+        'company': company.id,
+        'party': party.id,
+        'product': product.id,
+        'payment_term': payment_term.id,
+        }
+
+
+@contextmanager
+def measure(name, size, results):
+    "Record latency, query count and peak memory of the block"
+    connection = Transaction().connection
+    queries = []
+    trace = getattr(connection, 'set_trace_callback', None)
+    if trace:
+        trace(queries.append)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if trace:
+            trace(None)
+        results.append({
+                'name': name,
+                'size': size,
+                'latency': elapsed,
+                'queries': len(queries) if trace else None,
+                'memory': peak,
+                })
+
+
+def _new_lines(data, size, type_='out'):
+    pool = Pool()
+    Company = pool.get('company.company')
+    Invoice = pool.get('account.invoice')
+    InvoiceLine = pool.get('account.invoice.line')
+    Product = pool.get('product.product')
+
+    product = Product(data['product'])
+    company = Company(data['company'])
+    invoice = Invoice(type=type_, company=company,
+        currency=company.currency, party=data['party'],
+        payment_term=data['payment_term'],
+        invoice_date=datetime.date.today())
+    invoice.on_change_type()
+    invoice.on_change_party()
+    lines = []
+    for i in range(size):
+        line = InvoiceLine(invoice=invoice, type='line',
+            company=data['company'], currency=invoice.currency,
+            invoice_type=type_, product=product)
+        line.on_change_product()
+        lines.append(line)
+    invoice.lines = lines
+    return invoice, lines
+
+
+def bench_on_change(data, size, results):
+    _, lines = _new_lines(data, size)
+    # account_invoice has no on_change for quantity and unit price
+    if hasattr(lines[0], 'on_change_quantity'):
+        with measure('on_change_quantity', size, results):
+            for i, line in enumerate(lines, 1):
+                line.quantity = i % 100 + 1
+                line.on_change_quantity()
+        with measure('on_change_unit_price', size, results):
+            for line in lines:
+                line.unit_price = Decimal('50')
+                line.on_change_unit_price()
+    with measure('on_change_with_amount', size, results):
+        for i, line in enumerate(lines, 1):
+            line.quantity = i % 100 + 1
+            line.unit_price = Decimal('50')
+            line.amount = line.on_change_with_amount()
+    if not hasattr(lines[0], 'on_change_info_quantity'):
+        return
+    with measure('on_change_info_quantity', size, results):
+        for line in lines:
+            line.info_quantity = 10.0
+            line.on_change_info_quantity()
+
+
+def bench_credit(data, size, results):
+    pool = Pool()
+    Invoice = pool.get('account.invoice')
+    InvoiceLine = pool.get('account.invoice.line')
+    invoice, lines = _new_lines(data, size)
+    for line in lines:
+        line.quantity = 5
+        line.unit_price = Decimal('40')
+    if hasattr(InvoiceLine, 'set_info_values'):
+        InvoiceLine.set_info_values(lines)
+    invoice.save()
+    invoice = Invoice(invoice.id)
+    with measure('_credit', size, results):
+        for line in invoice.lines:
+            line._credit()
+
+
+def bench_sale(data, size, results):
+    pool = Pool()
+    Sale = pool.get('sale.sale')
+    SaleLine = pool.get('sale.line')
+    Product = pool.get('product.product')
+
+    product = Product(data['product'])
+    sale = Sale(company=data['company'], party=data['party'],
+        payment_term=data['payment_term'], invoice_method='order',
+        shipment_method='manual')
+    sale.on_change_party()
+    lines = []
+    for i in range(size):
+        line = SaleLine(type='line', product=product, quantity=5)
+        line.sale = sale
+        line.on_change_product()
+        lines.append(line)
+    sale.lines = lines
+    sale.save()
+    Sale.quote([sale])
+    Sale.confirm([sale])
+    sale = Sale(sale.id)
+    with measure('SaleLine.get_invoice_line', size, results):
+        for line in sale.lines:
+            line.get_invoice_line()
+    with measure('Sale.create_invoice', size, results):
+        sale.create_invoice()
+
+
+BENCHMARKS = [bench_on_change, bench_credit, bench_sale]
+
+
+def run(sizes=None, benchmarks=None, data=None):
+    "Run the benchmarks and return the list of results"
+    if data is None:
+        data = setup()
+    results = []
+    for size in sizes or SIZES:
+        for benchmark in benchmarks or BENCHMARKS:
+            with Transaction().start(DB_NAME, USER,
+                    context={'company': data['company']}) as transaction:
+                benchmark(data, size, results)
+                transaction.rollback()
+    return results
+
+
+def on_change_payloads(data=None):
+    "Return the fields sent by the client for each on_change of invoice line"
+    if data is None:
+        data = setup()
+    with Transaction().start(DB_NAME, USER,
+            context={'company': data['company']}):
+        InvoiceLine = Pool().get('account.invoice.line')
+        return {name: sorted(field.on_change)
+            for name, field in InvoiceLine._fields.items()
+            if field.on_change}
+
+
+def report_payloads(payloads):
+    print('%-28s %8s  %s' % ('on_change', 'fields', 'payload'))
+    for name, fields in sorted(payloads.items()):
+        print('%-28s %8d  %s' % (name, len(fields), ', '.join(fields)))
+
+
+def compare(sizes=None):
+    '''
+    Return the results of the plain account_invoice module and of this
+    module with a product without information unit
+    '''
+    baseline = run(sizes, data=setup(('account_invoice', 'sale')))
+    results = run(sizes, data=setup(use_info_unit=False))
+    return baseline, results
+
+
+def report(results):
+    print('%-28s %8s %12s %9s %12s' % (
+            'benchmark', 'size', 'latency (s)', 'queries', 'memory (KiB)'))
+    for result in results:
+        print('%-28s %8d %12.4f %9s %12d' % (
+                result['name'], result['size'], result['latency'],
+                result['queries'] if result['queries'] is not None else '-',
+                result['memory'] // 1024))
+
+
+def report_compare(baseline, results):
+    print('%-28s %8s %12s %12s %9s' % (
+            'benchmark', 'size', 'baseline (s)', 'latency (s)', 'overhead'))
+    baseline = {(r['name'], r['size']): r for r in baseline}
+    for result in results:
+        base = baseline.get((result['name'], result['size']))
+        if not base:
+            continue
+        print('%-28s %8d %12.4f %12.4f %8.1f%%' % (
+                result['name'], result['size'], base['latency'],
+                result['latency'],
+                (result['latency'] / base['latency'] - 1) * 100
+                if base['latency'] else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES)
+    parser.add_argument('--on-change', action='store_true',
+        help="report the payload of the on_changes instead of timing")
+    parser.add_argument('--compare', action='store_true',
+        help="compare a product without information unit to "
+        "account_invoice")
+    args = parser.parse_args()
+    if args.on_change:
+        report_payloads(on_change_payloads())
+    elif args.compare:
+        report_compare(*compare(args.sizes))
+    else:
+        report(run(args.sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,719 @@
-
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
+import csv
+import datetime
+import io
+import itertools
+import json
+from decimal import Decimal
+from unittest.mock import patch
 
-from trytond.modules.company.tests import CompanyTestMixin
-from trytond.tests.test_tryton import ModuleTestCase
+from trytond.modules.account.tests import create_chart, get_fiscalyear
+from trytond.modules.account_invoice_information_uom import sale as sale_module
+from trytond.modules.account_invoice_information_uom.export import (
+    COLUMNS, export_lines, write_csv, write_jsonl)
+from trytond.modules.account_invoice.tests import set_invoice_sequences
+from trytond.modules.account_invoice_information_uom.exceptions import (
+    InformationPendingError)
+from trytond.modules.company.tests import (
+    CompanyTestMixin, create_company, set_company)
+from trytond.modules.product import price_digits
+from trytond.pool import Pool
+from trytond.tests.test_tryton import ModuleTestCase, with_transaction
+from trytond.transaction import Transaction
 
 
 class AccountInvoiceInformationUomTestCase(CompanyTestMixin, ModuleTestCase):
     'Test AccountInvoiceInformationUom module'
     module = 'account_invoice_information_uom'
+    extras = ['sale']
+
+    @with_transaction()
+    def test_on_change_match_previous_on_changes(self):
+        "Test on_changes match the previous single line on_changes"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Template = pool.get('product.template')
+        Product = pool.get('product.product')
+        InvoiceLine = pool.get('account.invoice.line')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+        g = Uom(ModelData.get_id('product', 'uom_gram'))
+        exp = Decimal(str(10 ** -price_digits[1]))
+
+        # The previous on_changes computed with the template methods of
+        # product_information_uom, the products without information unit
+        # are left empty
+        def info_quantity(line):
+            if not template.use_info_unit or not line.quantity:
+                return
+            return template.calc_info_quantity(line.quantity, line.unit)
+
+        def info_unit_price(line):
+            if (not template.use_info_unit
+                    or line.unit_price is None or not line.unit):
+                return
+            price = line.unit_price
+            if line.unit != template.default_uom:
+                price = Uom.compute_price(
+                    line.unit, price, template.default_uom)
+            return template.get_info_unit_price(
+                price, line.info_unit).quantize(exp)
+
+        def on_change_quantity(line):
+            if not template.use_info_unit:
+                return {'info_quantity': None}
+            return {'info_quantity': line.unit.round(float(
+                        template.calc_info_quantity(
+                            line.quantity, line.unit)))}
+
+        def on_change_unit(line):
+            return {
+                'info_quantity': info_quantity(line),
+                'info_unit_price': info_unit_price(line),
+                }
+
+        def on_change_unit_price(line):
+            price = line.unit_price
+            if not template.use_info_unit:
+                price = None
+            elif price is not None:
+                if line.unit and line.unit != template.default_uom:
+                    price = Uom.compute_price(
+                        line.unit, price, template.default_uom)
+                price = round(template.get_info_unit_price(
+                        price, line.info_unit), price_digits[1])
+            return {'info_unit_price': price}
+
+        company = create_company()
+        with set_company(company):
+            templates = Template.create([{
+                        'name': "By unit",
+                        'default_uom': unit.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'products': [('create', [{}])],
+                        }, {
+                        'name': "By weight",
+                        'default_uom': kg.id,
+                        'use_info_unit': True,
+                        'info_unit': unit.id,
+                        'info_ratio': Decimal('0.5'),
+                        'products': [('create', [{}])],
+                        }, {
+                        'name': "Without information unit",
+                        'default_uom': kg.id,
+                        'products': [('create', [{}])],
+                        }])
+
+            for template in templates:
+                product, = Product.search([('template', '=', template.id)])
+                units = [u for u in [unit, kg, g]
+                    if u.category == template.default_uom.category]
+                info_units = [None]
+                if template.info_unit:
+                    info_units = [u for u in [unit, kg, g]
+                        if u.category == template.info_unit.category]
+                for line_unit, info_unit, quantity, unit_price in (
+                        itertools.product(
+                            units + [None], info_units, [5, -5, 0, 250, 500],
+                            [Decimal('40'), Decimal('0.0001'), None])):
+                    line = InvoiceLine(
+                        type='line', currency=company.currency,
+                        product=product, unit=line_unit,
+                        info_unit=info_unit, quantity=quantity,
+                        unit_price=unit_price)
+                    for name, expected in [
+                            ('quantity', on_change_quantity),
+                            ('unit', on_change_unit),
+                            ('unit_price', on_change_unit_price),
+                            ]:
+                        if name == 'quantity' and not line_unit:
+                            continue
+                        with self.subTest(
+                                template=template.name,
+                                unit=getattr(line_unit, 'name', None),
+                                info_unit=getattr(info_unit, 'name', None),
+                                quantity=quantity, unit_price=unit_price,
+                                on_change=name):
+                            getattr(line, 'on_change_' + name)()
+                            for field, value in expected(line).items():
+                                self.assertEqual(
+                                    getattr(line, field), value, msg=field)
+
+                    if not line_unit or not template.use_info_unit:
+                        continue
+                    with self.subTest(
+                            template=template.name, unit=line_unit.name,
+                            on_change='info_quantity'):
+                        line.info_quantity = 7.0
+                        line.on_change_info_quantity()
+                        self.assertEqual(
+                            line.quantity, template.calc_quantity(
+                                7.0, line_unit))
+                        self.assertEqual(
+                            line.amount, line.on_change_with_amount())
+
+                    with self.subTest(
+                            template=template.name, unit=line_unit.name,
+                            on_change='info_unit_price'):
+                        line.info_unit_price = Decimal('12.3456')
+                        line.on_change_info_unit_price()
+                        self.assertEqual(
+                            line.unit_price, template.get_unit_price(
+                                Decimal('12.3456'), unit=line_unit
+                                ).quantize(exp))
+                        self.assertEqual(
+                            line.amount, line.on_change_with_amount())
+
+            # The information quantity is rounded to the unit of the line
+            template, = Template.create([{
+                        'name': "Light product",
+                        'default_uom': unit.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 0.25,
+                        'products': [('create', [{}])],
+                        }])
+            product, = Product.search([('template', '=', template.id)])
+            line = InvoiceLine(product=product, unit=unit, quantity=1)
+            line.on_change_quantity()
+            self.assertEqual(line.info_quantity, 0)
+            self.assertEqual(line.on_change_with_info_quantity(), 0.25)
+
+        # The on_changes are not followed by on_change_with
+        self.assertFalse(InvoiceLine.info_quantity.on_change_with)
+        self.assertFalse(InvoiceLine.info_unit_price.on_change_with)
+    @with_transaction()
+    def test_backfill_info_values(self):
+        "Test the backfill in SQL matches the computation in Python"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Template = pool.get('product.template')
+        Product = pool.get('product.product')
+        Account = pool.get('account.account')
+        Party = pool.get('party.party')
+        InvoiceLine = pool.get('account.invoice.line')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+        g = Uom(ModelData.get_id('product', 'uom_gram'))
+        third, = Uom.create([{
+                    'name': "Third of kilogram",
+                    'symbol': "kg/3",
+                    'category': kg.category.id,
+                    'rate': 3,
+                    'factor': 0.333333333333,
+                    }])
+        self.assertEqual(third.accurate_field, 'rate')
+
+        company = create_company()
+        with set_company(company):
+            create_chart(company)
+            account, = Account.search([
+                    ('type.revenue', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            party, = Party.create([{'name': "Customer"}])
+            by_unit, by_weight = Template.create([{
+                        'name': "By unit",
+                        'default_uom': unit.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'products': [('create', [{}])],
+                        }, {
+                        'name': "By weight",
+                        'default_uom': kg.id,
+                        'use_info_unit': True,
+                        'info_unit': unit.id,
+                        'info_ratio': Decimal('0.5'),
+                        'products': [('create', [{}])],
+                        }])
+            vlist = []
+            for template, line_unit, quantity, unit_price in [
+                    # Halves rounded to even
+                    (by_weight, kg, 5, Decimal('10')),
+                    (by_weight, kg, 7, Decimal('0.0001')),
+                    (by_unit, unit, 3, Decimal('0.0001')),
+                    (by_unit, unit, 1, Decimal('0.0003')),
+                    (by_weight, g, 2500, Decimal('0.0123')),
+                    (by_weight, third, 3, Decimal('10')),
+                    (by_weight, third, -7, Decimal('1.2345')),
+                    (by_unit, unit, 0, Decimal('0')),
+                    ]:
+                product, = Product.search([('template', '=', template.id)])
+                vlist.append({
+                        'type': 'line',
+                        'invoice_type': 'out',
+                        'party': party.id,
+                        'company': company.id,
+                        'currency': company.currency.id,
+                        'account': account.id,
+                        'product': product.id,
+                        'unit': line_unit.id,
+                        'quantity': quantity,
+                        'unit_price': unit_price,
+                        'info_quantity': 0,
+                        'info_unit_price': 0,
+                        })
+            lines = InvoiceLine.create(vlist)
+
+            InvoiceLine._backfill_info_values()
+            Transaction().cache.clear()
+
+            lines = InvoiceLine.browse([l.id for l in lines])
+            for line, (info_quantity, info_unit_price) in zip(
+                    lines, InvoiceLine.get_info_values(lines)):
+                with self.subTest(
+                        unit=line.unit.name, quantity=line.quantity,
+                        unit_price=line.unit_price):
+                    self.assertEqual(line.info_quantity, info_quantity)
+                    self.assertEqual(line.info_unit_price, info_unit_price)
+
+    @with_transaction()
+    def test_import_info_lines(self):
+        "Test the imported lines match the information on_changes"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Template = pool.get('product.template')
+        Product = pool.get('product.product')
+        Account = pool.get('account.account')
+        Party = pool.get('party.party')
+        InvoiceLine = pool.get('account.invoice.line')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+        g = Uom(ModelData.get_id('product', 'uom_gram'))
+
+        company = create_company()
+        with set_company(company):
+            create_chart(company)
+            account, = Account.search([
+                    ('type.revenue', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            party, = Party.create([{'name': "Customer"}])
+            by_unit, by_weight = Template.create([{
+                        'name': "By unit",
+                        'default_uom': unit.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'products': [('create', [{}])],
+                        }, {
+                        'name': "By weight",
+                        'default_uom': kg.id,
+                        'use_info_unit': True,
+                        'info_unit': unit.id,
+                        'info_ratio': Decimal('0.5'),
+                        'products': [('create', [{}])],
+                        }])
+            rows = []
+            for template, line_unit, info_quantity, info_unit_price in [
+                    (by_unit, unit, 10, Decimal('20')),
+                    (by_unit, None, 7, Decimal('0.0123')),
+                    (by_weight, g, 3, Decimal('24.6')),
+                    (by_weight, kg, 5, Decimal('10')),
+                    (by_weight, None, 2, Decimal('5')),
+                    ]:
+                product, = Product.search([('template', '=', template.id)])
+                row = {
+                    'type': 'line',
+                    'invoice_type': 'out',
+                    'party': party.id,
+                    'company': company.id,
+                    'currency': company.currency.id,
+                    'account': account.id,
+                    'product': product.id,
+                    'info_quantity': info_quantity,
+                    'info_unit_price': info_unit_price,
+                    }
+                if line_unit:
+                    row['unit'] = line_unit.id
+                rows.append(row)
+
+            self.assertEqual(InvoiceLine.import_info_lines(rows, size=2), 5)
+
+            lines = InvoiceLine.search([], order=[('id', 'ASC')])
+            self.assertEqual(
+                [l.unit for l in lines], [unit, unit, g, kg, kg])
+            self.assertEqual(lines[0].quantity, 5)
+            self.assertEqual(lines[0].unit_price, Decimal('40'))
+            for line, row in zip(lines, rows):
+                with self.subTest(
+                        product=line.product.rec_name, unit=line.unit.name):
+                    reference = InvoiceLine(
+                        type='line', currency=company.currency,
+                        product=line.product, unit=line.unit,
+                        info_unit=line.info_unit)
+                    reference.info_quantity = row['info_quantity']
+                    reference.on_change_info_quantity()
+                    reference.info_unit_price = row['info_unit_price']
+                    reference.on_change_info_unit_price()
+                    self.assertEqual(line.quantity, reference.quantity)
+                    self.assertEqual(line.unit_price, reference.unit_price)
+                    self.assertEqual(line.info_quantity, row['info_quantity'])
+                    self.assertEqual(
+                        line.info_unit_price, row['info_unit_price'])
+
+    @with_transaction()
+    def test_deferred_info_values(self):
+        "Test the information values deferred to a queued task"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Account = pool.get('account.account')
+        Category = pool.get('product.category')
+        Template = pool.get('product.template')
+        Product = pool.get('product.product')
+        Party = pool.get('party.party')
+        Sale = pool.get('sale.sale')
+        Invoice = pool.get('account.invoice')
+        Queue = pool.get('ir.queue')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+
+        company = create_company()
+        with set_company(company), \
+                patch.object(sale_module, '_DEFER', True):
+            create_chart(company)
+            revenue, = Account.search([
+                    ('type.revenue', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            category, = Category.create([{
+                        'name': "Category",
+                        'accounting': True,
+                        'account_revenue': revenue.id,
+                        }])
+            template, = Template.create([{
+                        'name': "Product",
+                        'type': 'service',
+                        'default_uom': unit.id,
+                        'salable': True,
+                        'sale_uom': unit.id,
+                        'list_price': Decimal('40'),
+                        'account_category': category.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'products': [('create', [{}])],
+                        }])
+            product, = Product.search([('template', '=', template.id)])
+            party, = Party.create([{
+                        'name': "Customer",
+                        'addresses': [('create', [{}])],
+                        }])
+            sale, = Sale.create([{
+                        'party': party.id,
+                        'invoice_address': party.addresses[0].id,
+                        'lines': [('create', [{
+                                        'product': product.id,
+                                        'quantity': 5,
+                                        'unit': unit.id,
+                                        'unit_price': Decimal('40'),
+                                        }])],
+                        }])
+            Sale.quote([sale])
+            Sale.confirm([sale])
+            Sale.process([sale])
+
+            invoice, = sale.invoices
+            line, = invoice.lines
+            self.assertTrue(line.info_pending)
+            self.assertIsNone(line.info_quantity)
+            task, = [q for q in Queue.search([])
+                if q.data['method'] == 'fill_pending_info_values']
+            self.assertEqual(list(task.data['instances']), [line.id])
+
+            with self.assertRaises(InformationPendingError):
+                Invoice.post([invoice])
+
+            task.run()
+            line = line.__class__(line.id)
+            self.assertFalse(line.info_pending)
+            self.assertEqual(line.info_quantity, 10)
+            self.assertEqual(line.info_unit_price, Decimal('20'))
+            Invoice.validate_invoice([invoice])
+            self.assertEqual(invoice.state, 'validated')
+
+    @with_transaction()
+    def test_update_info_invoice_lines(self):
+        "Test editing the template refreshes only the draft lines"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+        Category = pool.get('product.category')
+        FiscalYear = pool.get('account.fiscalyear')
+        Template = pool.get('product.template')
+        Product = pool.get('product.product')
+        Party = pool.get('party.party')
+        Invoice = pool.get('account.invoice')
+        InvoiceLine = pool.get('account.invoice.line')
+        Queue = pool.get('ir.queue')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+        g = Uom(ModelData.get_id('product', 'uom_gram'))
+
+        company = create_company()
+        with set_company(company):
+            create_chart(company)
+            fiscalyear = set_invoice_sequences(get_fiscalyear(company))
+            fiscalyear.save()
+            FiscalYear.create_period([fiscalyear])
+            receivable, = Account.search([
+                    ('type.receivable', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            revenue, = Account.search([
+                    ('type.revenue', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            journal, = Journal.search([('type', '=', 'revenue')], limit=1)
+            category, = Category.create([{
+                        'name': "Category",
+                        'accounting': True,
+                        'account_revenue': revenue.id,
+                        }])
+            template, = Template.create([{
+                        'name': "Product",
+                        'default_uom': unit.id,
+                        'account_category': category.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'products': [('create', [{}])],
+                        }])
+            product, = Product.search([('template', '=', template.id)])
+            party, = Party.create([{
+                        'name': "Customer",
+                        'addresses': [('create', [{}])],
+                        }])
+            draft, posted = Invoice.create([{
+                        'type': 'out',
+                        'party': party.id,
+                        'invoice_address': party.addresses[0].id,
+                        'journal': journal.id,
+                        'account': receivable.id,
+                        'lines': [('create', [{
+                                        'product': product.id,
+                                        'account': revenue.id,
+                                        'quantity': 5,
+                                        'unit': unit.id,
+                                        'unit_price': Decimal('40'),
+                                        'info_quantity': 10,
+                                        'info_unit_price': Decimal('20'),
+                                        }])],
+                        }] * 2)
+            Invoice.post([posted])
+            self.assertEqual(posted.state, 'posted')
+
+            def run_tasks():
+                while True:
+                    tasks = Queue.search([])
+                    if not tasks:
+                        break
+                    for task in tasks:
+                        task.run()
+                    Queue.delete(tasks)
+
+            Template.write([template], {'info_ratio': 4})
+            self.assertIn('update_info_invoice_lines',
+                [q.data['method'] for q in Queue.search([])])
+            self.assertEqual(draft.lines[0].info_quantity, 10)
+            run_tasks()
+            draft_line, = InvoiceLine.browse([draft.lines[0].id])
+            posted_line, = InvoiceLine.browse([posted.lines[0].id])
+            self.assertEqual(draft_line.info_quantity, 20)
+            self.assertEqual(draft_line.info_unit_price, Decimal('10'))
+            self.assertEqual(posted_line.info_quantity, 10)
+            self.assertEqual(posted_line.info_unit_price, Decimal('20'))
+
+            Template.write([template], {'info_unit': g.id})
+            run_tasks()
+            draft_line, = InvoiceLine.browse([draft.lines[0].id])
+            posted_line, = InvoiceLine.browse([posted.lines[0].id])
+            self.assertEqual(draft_line.info_unit, g)
+            self.assertEqual(draft_line.info_quantity, 20)
+            self.assertEqual(draft_line.info_unit_price, Decimal('10'))
+            self.assertEqual(posted_line.info_unit, kg)
+            self.assertEqual(posted_line.info_quantity, 10)
+            self.assertEqual(posted_line.info_unit_price, Decimal('20'))
+
+    @with_transaction()
+    def test_export_lines(self):
+        "Test the export of the lines with their information fields"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+        FiscalYear = pool.get('account.fiscalyear')
+        Category = pool.get('product.category')
+        Template = pool.get('product.template')
+        Product = pool.get('product.product')
+        Party = pool.get('party.party')
+        Invoice = pool.get('account.invoice')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+        today = datetime.date.today()
+
+        company = create_company()
+        with set_company(company):
+            create_chart(company)
+            fiscalyear = set_invoice_sequences(get_fiscalyear(company))
+            fiscalyear.save()
+            FiscalYear.create_period([fiscalyear])
+            receivable, = Account.search([
+                    ('type.receivable', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            revenue, = Account.search([
+                    ('type.revenue', '=', True),
+                    ('closed', '!=', True),
+                    ], limit=1)
+            journal, = Journal.search([('type', '=', 'revenue')], limit=1)
+            category, = Category.create([{
+                        'name': "Category",
+                        'accounting': True,
+                        'account_revenue': revenue.id,
+                        }])
+            info_template, template = Template.create([{
+                        'name': "Product",
+                        'default_uom': unit.id,
+                        'account_category': category.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'products': [('create', [{'suffix_code': "P1"}])],
+                        }, {
+                        'name': "Product without information unit",
+                        'default_uom': unit.id,
+                        'account_category': category.id,
+                        'products': [('create', [{'suffix_code': "P2"}])],
+                        }])
+            info_product, = info_template.products
+            product, = template.products
+            party, = Party.create([{
+                        'name': "Customer",
+                        'addresses': [('create', [{}])],
+                        }])
+            invoice, = Invoice.create([{
+                        'type': 'out',
+                        'party': party.id,
+                        'invoice_address': party.addresses[0].id,
+                        'journal': journal.id,
+                        'account': receivable.id,
+                        'invoice_date': today,
+                        'lines': [('create', [{
+                                        'product': info_product.id,
+                                        'account': revenue.id,
+                                        'quantity': 5,
+                                        'unit': unit.id,
+                                        'unit_price': Decimal('40'),
+                                        'info_quantity': 10,
+                                        'info_unit_price': Decimal('20'),
+                                        }, {
+                                        'product': product.id,
+                                        'account': revenue.id,
+                                        'quantity': 3,
+                                        'unit': unit.id,
+                                        'unit_price': Decimal('10'),
+                                        }])],
+                        }])
+            Invoice.post([invoice])
+            info_line, line = invoice.lines
+            self.assertIsNone(line.info_unit)
+            # The template uses an information unit after the line is stored
+            Template.write([template], {
+                    'use_info_unit': True,
+                    'info_unit': kg.id,
+                    'info_ratio': 1,
+                    })
+
+            chunks = list(export_lines(company=company.id, size=1))
+            self.assertEqual(len(chunks), 2)
+            self.assertEqual(list(itertools.chain(*chunks)), [
+                    (info_line.id, invoice.number, 'out', today, party.code,
+                        "P1", 5, 'u', Decimal('40'), 10, 'kg', Decimal('20')),
+                    (line.id, invoice.number, 'out', today, party.code,
+                        "P2", 3, 'u', Decimal('10'), None, 'kg', None),
+                    ])
+            self.assertEqual(
+                list(export_lines(company=company.id, to_date=(
+                            today - datetime.timedelta(days=1)))), [])
+
+            output = io.StringIO()
+            self.assertEqual(write_csv(output, export_lines()), 2)
+            output.seek(0)
+            header, *csv_rows = csv.reader(output)
+            self.assertEqual(header, COLUMNS)
+            self.assertEqual(
+                [r[0] for r in csv_rows], [str(info_line.id), str(line.id)])
+            self.assertEqual(float(csv_rows[0][-3]), 10)
+            self.assertEqual(csv_rows[0][-2], 'kg')
+            self.assertEqual(Decimal(csv_rows[0][-1]), Decimal('20'))
+            self.assertEqual(csv_rows[1][-3:], ['', 'kg', ''])
+
+            output = io.StringIO()
+            self.assertEqual(write_jsonl(output, export_lines()), 2)
+            output.seek(0)
+            json_rows = [json.loads(l) for l in output]
+            self.assertEqual(json_rows[0]['invoice_date'], today.isoformat())
+            self.assertEqual(
+                Decimal(json_rows[0]['info_unit_price']), Decimal('20'))
+            self.assertEqual(json_rows[1]['info_quantity'], None)
+            self.assertEqual(json_rows[1]['info_unit'], 'kg')
+
+    @with_transaction()
+    def test_info_list_price_stored(self):
+        "Test the information list price is read from the stored column"
+        pool = Pool()
+        Uom = pool.get('product.uom')
+        Template = pool.get('product.template')
+        ListPrice = pool.get('product.list_price')
+        ModelData = pool.get('ir.model.data')
+
+        unit = Uom(ModelData.get_id('product', 'uom_unit'))
+        kg = Uom(ModelData.get_id('product', 'uom_kilogram'))
+        company = create_company()
+        with set_company(company):
+            template, = Template.create([{
+                        'name': "Product",
+                        'default_uom': unit.id,
+                        'use_info_unit': True,
+                        'info_unit': kg.id,
+                        'info_ratio': 2,
+                        'list_price': Decimal('40'),
+                        }])
+            self.assertEqual(template.info_list_price, Decimal('20.0000'))
+
+            table = ListPrice.__table__()
+            cursor = Transaction().connection.cursor()
+            cursor.execute(*table.update(
+                    [table.info_list_price], [Decimal('12.3456')],
+                    where=table.template == template.id))
+            Transaction().cache.clear()
+            template = Template(template.id)
+            self.assertEqual(template.info_list_price, Decimal('12.3456'))
+
+            # Unsaved templates are computed
+            template = Template(
+                default_uom=unit, use_info_unit=True, info_unit=kg,
+                info_ratio=4, list_price=Decimal('40'))
+            self.assertEqual(
+                template.on_change_with_info_list_price(), Decimal('10.0000'))
 
 
 del ModuleTestCase
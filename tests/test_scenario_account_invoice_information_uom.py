@@ -2,12 +2,14 @@ import datetime
 import unittest
 from decimal import Decimal
 
-from proteus import Model
+from proteus import Model, Wizard
 from trytond.modules.account.tests.tools import (create_chart,
                                                  create_fiscalyear,
                                                  get_accounts)
 from trytond.modules.account_invoice.tests.tools import \
     set_fiscalyear_invoice_sequences
+from trytond.modules.account_invoice_information_uom.exceptions import (
+    InformationRequiredError)
 from trytond.modules.company.tests.tools import create_company, get_company
 from trytond.tests.test_tryton import drop_db
 from trytond.tests.tools import activate_modules
@@ -75,6 +77,16 @@ class Test(unittest.TestCase):
         template.account_category = account_category
         template.save()
         self.assertEqual(template.info_list_price, Decimal('20.0000'))
+        self.assertEqual(ProductTemplate.find(
+                [('info_list_price', '=', Decimal('20'))]), [template])
+        template.info_ratio = Decimal('4')
+        template.save()
+        self.assertEqual(template.info_list_price, Decimal('10.0000'))
+        self.assertEqual(ProductTemplate.find(
+                [('info_list_price', '>', Decimal('10'))],
+                order=[('info_list_price', 'DESC')]), [])
+        template.info_ratio = Decimal('2')
+        template.save()
         product, = template.products
         product.save()
 
@@ -115,6 +127,9 @@ class Test(unittest.TestCase):
         self.assertEqual(line.info_unit_price, Decimal('20000.0000'))
         self.assertEqual(line.unit_price, Decimal('40'))
         self.assertEqual(line.amount, Decimal('200.00'))
+        self.assertEqual(line.info_ratio, 2.0)
+        self.assertEqual(line.info_factor, 1.0)
+        self.assertEqual(line.info_unit_factor, 1000.0)
 
         # Supplier invoice
         Invoice = Model.get('account.invoice')
@@ -145,3 +160,144 @@ class Test(unittest.TestCase):
         self.assertEqual(line.info_unit_price, Decimal('20000.0000'))
         self.assertEqual(line.unit_price, Decimal('40'))
         self.assertEqual(line.amount, Decimal('200.00'))
+
+        # Product without information unit
+        template = ProductTemplate()
+        template.name = 'product without information unit'
+        template.default_uom = unit
+        template.type = 'service'
+        template.list_price = Decimal('10')
+        template.account_category = account_category
+        template.save()
+        product, = template.products
+        invoice = Invoice()
+        invoice.type = 'out'
+        invoice.party = party
+        invoice.payment_term = payment_term
+        invoice.invoice_date = today
+        line = invoice.lines.new()
+        line.product = product
+        self.assertEqual(line.show_info_unit, False)
+        line.quantity = 5
+        line.unit_price = Decimal('10')
+        self.assertEqual(line.info_quantity, None)
+        self.assertEqual(line.info_unit_price, None)
+        self.assertEqual(line.amount, Decimal('50.00'))
+        invoice.save()
+        line, = invoice.lines
+        self.assertEqual(line.info_unit, None)
+        self.assertEqual(line.info_quantity, None)
+        self.assertEqual(line.info_unit_price, None)
+
+        # Information fields are required to post
+        invoice.click('validate_invoice')
+        template.use_info_unit = True
+        template.info_unit = kg
+        template.info_ratio = 2
+        template.save()
+        with self.assertRaises(InformationRequiredError):
+            invoice.click('post')
+        template.use_info_unit = False
+        template.save()
+        invoice.click('post')
+        self.assertEqual(invoice.state, 'posted')
+
+        # Credit invoices with and without information quantity
+        info_template, = ProductTemplate.find([('name', '=', 'product')])
+        info_product, = info_template.products
+        info_invoice = Invoice()
+        info_invoice.type = 'out'
+        info_invoice.party = party
+        info_invoice.payment_term = payment_term
+        info_invoice.invoice_date = today
+        line = info_invoice.lines.new()
+        line.product = info_product
+        line.quantity = 5
+        line.unit_price = Decimal('40')
+        info_invoice.click('post')
+        credit = Wizard('account.invoice.credit', [info_invoice, invoice])
+        credit.form.with_refund = False
+        credit.execute('credit')
+        info_line, = info_invoice.lines
+        credit_line, = InvoiceLine.find([('origin', '=', info_line)])
+        self.assertEqual(credit_line.quantity, -5)
+        self.assertEqual(credit_line.info_quantity, -10.0)
+        self.assertEqual(credit_line.info_unit_price, Decimal('20.0000'))
+        self.assertEqual(credit_line.amount, Decimal('-200.00'))
+        line, = invoice.lines
+        credit_line, = InvoiceLine.find([('origin', '=', line)])
+        self.assertEqual(credit_line.quantity, -5)
+        self.assertEqual(credit_line.info_quantity, None)
+        self.assertEqual(credit_line.info_unit_price, None)
+
+        # Totals per information unit
+        totals_invoice = Invoice()
+        totals_invoice.type = 'out'
+        totals_invoice.party = party
+        totals_invoice.payment_term = payment_term
+        totals_invoice.invoice_date = today
+        for quantity in [5, 2]:
+            line = totals_invoice.lines.new()
+            line.product = info_product
+            line.quantity = quantity
+            line.unit_price = Decimal('40')
+        totals_invoice.save()
+        total, = totals_invoice.info_totals
+        self.assertEqual(total.info_unit, kg)
+        self.assertEqual(total.info_quantity, 14.0)
+        self.assertEqual(total.info_amount, Decimal('280.0000'))
+
+        line, moved_line = totals_invoice.lines
+        line.info_quantity = 12
+        totals_invoice.save()
+        total, = totals_invoice.info_totals
+        self.assertEqual(total.info_quantity, 16.0)
+        self.assertEqual(total.info_amount, Decimal('320.0000'))
+
+        other_invoice = Invoice()
+        other_invoice.type = 'out'
+        other_invoice.party = party
+        other_invoice.payment_term = payment_term
+        other_invoice.invoice_date = today
+        other_invoice.save()
+        self.assertEqual(other_invoice.info_totals, [])
+        moved_line = InvoiceLine(moved_line.id)
+        moved_line.invoice = other_invoice
+        moved_line.save()
+        totals_invoice.reload()
+        total, = totals_invoice.info_totals
+        self.assertEqual(total.info_quantity, 12.0)
+        self.assertEqual(total.info_amount, Decimal('240.0000'))
+        other_invoice.reload()
+        total, = other_invoice.info_totals
+        self.assertEqual(total.info_quantity, 4.0)
+        self.assertEqual(total.info_amount, Decimal('80.0000'))
+
+        moved_line.delete()
+        other_invoice.reload()
+        self.assertEqual(other_invoice.info_totals, [])
+
+        # Report of the posted information quantities per party
+        totals_invoice.click('post')
+        other_party = Party(name='Other Party')
+        other_party.save()
+        other_invoice = Invoice()
+        other_invoice.type = 'out'
+        other_invoice.party = other_party
+        other_invoice.payment_term = payment_term
+        other_invoice.invoice_date = today
+        line = other_invoice.lines.new()
+        line.product = info_product
+        line.quantity = 1
+        line.unit_price = Decimal('40')
+        other_invoice.click('post')
+        Report = Model.get('account.invoice.line.information_uom')
+        report, = Report.find([('party', '=', party.id)])
+        self.assertEqual(report.invoice_type, 'out')
+        self.assertEqual(report.product, info_product)
+        self.assertEqual(report.info_unit, kg)
+        self.assertEqual(report.info_quantity, 22.0)
+        self.assertEqual(report.info_amount, Decimal('440.00'))
+        report, = Report.find([('party', '=', other_party.id)])
+        self.assertEqual(report.info_quantity, 2.0)
+        self.assertEqual(report.info_amount, Decimal('40.00'))
@@ -0,0 +1,191 @@
+import datetime
+import tracemalloc
+import unittest
+from decimal import Decimal
+
+from proteus import Model
+from trytond.modules.account.tests.tools import (
+    create_chart, create_fiscalyear, get_accounts)
+from trytond.modules.account_invoice.tests.tools import (
+    create_payment_term, set_fiscalyear_invoice_sequences)
+from trytond.modules.company.tests.tools import create_company, get_company
+from trytond.pool import Pool
+from trytond.tests.test_tryton import DB_NAME, USER, drop_db
+from trytond.tests.tools import activate_modules
+from trytond.transaction import Transaction
+
+ON_CHANGES = [
+    'on_change_quantity',
+    'on_change_unit',
+    'on_change_unit_price',
+    'on_change_info_quantity',
+    'on_change_info_unit_price',
+    'on_change_info_unit',
+    ]
+
+# Maximum number of queries per call once the product is read
+QUERIES = 0
+# Maximum peak of allocated bytes per call, it is far above the few KiB
+# measured to not depend on the Python version and the instrumentation but
+# it catches the reads or the copies of the invoice lines
+MEMORY = 64 * 1024
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        drop_db()
+        super().setUp()
+
+    def tearDown(self):
+        drop_db()
+        super().tearDown()
+
+    def test(self):
+
+        # Activate module
+        activate_modules('account_invoice_information_uom')
+
+        # Create company
+        _ = create_company()
+        company = get_company()
+
+        # Create fiscal year
+        fiscalyear = set_fiscalyear_invoice_sequences(
+            create_fiscalyear(company))
+        fiscalyear.click('create_period')
+
+        # Create chart of accounts
+        _ = create_chart(company)
+        accounts = get_accounts(company)
+
+        # Create party
+        Party = Model.get('party.party')
+        party = Party(name='Party')
+        party.save()
+
+        # Create account category
+        ProductCategory = Model.get('product.category')
+        account_category = ProductCategory(name="Account Category")
+        account_category.accounting = True
+        account_category.account_expense = accounts['expense']
+        account_category.account_revenue = accounts['revenue']
+        account_category.save()
+
+        # Create products sold by unit and by kilogram
+        ProductUom = Model.get('product.uom')
+        unit, = ProductUom.find([('name', '=', 'Unit')])
+        kg, = ProductUom.find([('name', '=', 'Kilogram')])
+        g, = ProductUom.find([('name', '=', 'Gram')])
+        ProductTemplate = Model.get('product.template')
+        by_unit = ProductTemplate()
+        by_unit.name = 'by unit'
+        by_unit.default_uom = unit
+        by_unit.use_info_unit = True
+        by_unit.info_unit = kg
+        by_unit.info_ratio = Decimal('2')
+        by_unit.type = 'service'
+        by_unit.list_price = Decimal('40')
+        by_unit.account_category = account_category
+        by_unit.save()
+        product_by_unit, = by_unit.products
+        by_weight = ProductTemplate()
+        by_weight.name = 'by weight'
+        by_weight.default_uom = kg
+        by_weight.use_info_unit = True
+        by_weight.info_unit = unit
+        by_weight.info_ratio = Decimal('0.5')
+        by_weight.type = 'service'
+        by_weight.list_price = Decimal('10')
+        by_weight.account_category = account_category
+        by_weight.save()
+        product_by_weight, = by_weight.products
+
+        # Create payment term
+        payment_term = create_payment_term()
+        payment_term.save()
+
+        data = {
+            'company': company.id,
+            'party': party.id,
+            'payment_term': payment_term.id,
+            }
+        scenarios = {
+            'same_unit': (product_by_unit.id, None, False),
+            'different_unit': (product_by_weight.id, g.id, False),
+            'credit_note': (product_by_unit.id, None, True),
+            }
+        for scenario, (product_id, unit_id, credit) in scenarios.items():
+            with self.subTest(scenario=scenario), \
+                    Transaction().start(DB_NAME, USER,
+                        context={'company': data['company']}) as transaction:
+                self.check_budget(
+                    dict(data, product=product_id), unit_id, credit)
+                transaction.rollback()
+
+    def new_line(self, data):
+        pool = Pool()
+        Company = pool.get('company.company')
+        Invoice = pool.get('account.invoice')
+        InvoiceLine = pool.get('account.invoice.line')
+        Product = pool.get('product.product')
+
+        company = Company(data['company'])
+        invoice = Invoice(type='out', company=company,
+            currency=company.currency, party=data['party'],
+            payment_term=data['payment_term'],
+            invoice_date=datetime.date.today())
+        invoice.on_change_type()
+        invoice.on_change_party()
+        line = InvoiceLine(invoice=invoice, type='line',
+            company=company, currency=invoice.currency,
+            invoice_type='out', product=Product(data['product']))
+        line.on_change_product()
+        invoice.lines = [line]
+        return invoice, line
+
+    def measure(self, method):
+        "Return the number of queries and the peak of memory of method"
+        connection = Transaction().connection
+        queries = []
+        trace = getattr(connection, 'set_trace_callback', None)
+        if trace:
+            trace(queries.append)
+        tracemalloc.start()
+        try:
+            method()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            if trace:
+                trace(None)
+        return len(queries) if trace else None, peak
+
+    def check_budget(self, data, unit_id, credit):
+        pool = Pool()
+        Invoice = pool.get('account.invoice')
+        Uom = pool.get('product.uom')
+
+        invoice, line = self.new_line(data)
+        if unit_id:
+            line.unit = Uom(unit_id)
+        line.quantity = 500 if unit_id else 5
+        line.unit_price = Decimal('40')
+        if credit:
+            line.on_change_quantity()
+            line.on_change_unit_price()
+            invoice.save()
+            credit_note, = Invoice.credit([invoice])
+            line, = credit_note.lines
+        line.info_quantity = 10.0
+        line.info_unit_price = Decimal('20')
+        # Warm up the reads of the product
+        for name in ON_CHANGES:
+            getattr(line, name)()
+
+        for name in ON_CHANGES:
+            queries, memory = self.measure(getattr(line, name))
+            if queries is not None:
+                self.assertLessEqual(queries, QUERIES,
+                    msg='%s queries' % name)
+            self.assertLessEqual(memory, MEMORY, msg='%s memory' % name)
@@ -0,0 +1,113 @@
+import unittest
+from decimal import Decimal
+
+from proteus import Model
+from trytond.modules.account.tests.tools import create_chart, get_accounts
+from trytond.modules.company.tests.tools import create_company, get_company
+from trytond.tests.test_tryton import drop_db
+from trytond.tests.tools import activate_modules
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        drop_db()
+        super().setUp()
+
+    def tearDown(self):
+        drop_db()
+        super().tearDown()
+
+    def test(self):
+
+        # Activate modules
+        activate_modules(['account_invoice_information_uom', 'sale'])
+
+        # Create company
+        _ = create_company()
+        company = get_company()
+
+        # Create chart of accounts
+        _ = create_chart(company)
+        accounts = get_accounts(company)
+
+        # Create party
+        Party = Model.get('party.party')
+        customer = Party(name='Customer')
+        customer.save()
+
+        # Create account category
+        ProductCategory = Model.get('product.category')
+        account_category = ProductCategory(name="Account Category")
+        account_category.accounting = True
+        account_category.account_revenue = accounts['revenue']
+        account_category.save()
+
+        # Create products sold by unit and by kilogram
+        ProductUom = Model.get('product.uom')
+        unit, = ProductUom.find([('name', '=', 'Unit')])
+        kg, = ProductUom.find([('name', '=', 'Kilogram')])
+        g, = ProductUom.find([('name', '=', 'Gram')])
+        ProductTemplate = Model.get('product.template')
+        by_unit = ProductTemplate()
+        by_unit.name = 'by unit'
+        by_unit.default_uom = unit
+        by_unit.use_info_unit = True
+        by_unit.info_unit = kg
+        by_unit.info_ratio = Decimal('2')
+        by_unit.type = 'service'
+        by_unit.salable = True
+        by_unit.list_price = Decimal('40')
+        by_unit.account_category = account_category
+        by_unit.save()
+        by_weight = ProductTemplate()
+        by_weight.name = 'by weight'
+        by_weight.default_uom = kg
+        by_weight.use_info_unit = True
+        by_weight.info_unit = unit
+        by_weight.info_ratio = Decimal('0.5')
+        by_weight.type = 'service'
+        by_weight.salable = True
+        by_weight.list_price = Decimal('10')
+        by_weight.account_category = account_category
+        by_weight.save()
+
+        # Sell the products with a line in another unit than the default
+        Sale = Model.get('sale.sale')
+        sale = Sale()
+        sale.party = customer
+        sale.invoice_method = 'order'
+        for template, line_unit, quantity, unit_price in [
+                (by_unit, unit, 5, Decimal('40')),
+                (by_weight, kg, 3, Decimal('10')),
+                (by_weight, g, 2500, Decimal('0.0123')),
+                ]:
+            line = sale.lines.new()
+            line.product, = template.products
+            line.unit = line_unit
+            line.quantity = quantity
+            line.unit_price = unit_price
+        sale.click('quote')
+        sale.click('confirm')
+        self.assertEqual(sale.state, 'processing')
+
+        # The invoice lines created in batch match the on_changes of a line
+        invoice, = sale.invoices
+        Invoice = Model.get('account.invoice')
+        reference = Invoice()
+        reference.party = customer
+        for sale_line, line in zip(sale.lines, invoice.lines):
+            self.assertEqual(line.origin, sale_line)
+            reference_line = reference.lines.new()
+            reference_line.product = sale_line.product
+            reference_line.unit = sale_line.unit
+            reference_line.quantity = sale_line.quantity
+            reference_line.unit_price = sale_line.unit_price
+            self.assertEqual(line.unit, sale_line.unit)
+            self.assertEqual(line.info_unit, reference_line.info_unit)
+            self.assertEqual(line.info_quantity, reference_line.info_quantity)
+            self.assertEqual(
+                line.info_unit_price, reference_line.info_unit_price)
+        line_g = invoice.lines[2]
+        self.assertEqual(line_g.info_quantity, 1.0)
+        self.assertEqual(line_g.info_unit_price, Decimal('24.6000'))
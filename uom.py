@@ -0,0 +1,15 @@
+# The COPYRIGHT file at the top level of this repository contains the full
+# copyright notices and license terms.
+from trytond.pool import PoolMeta
+
+from .template import clear_factor_cache
+
+
+class Uom(metaclass=PoolMeta):
+    __name__ = 'product.uom'
+
+    @classmethod
+    def on_modification(cls, mode, uoms, field_names=None):
+        super().on_modification(mode, uoms, field_names=field_names)
+        if mode in {'write', 'delete'}:
+            clear_factor_cache()